@@ -1,10 +1,14 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers.chat import chat_routes
 from routers.login import auth_routes
 from routers.notifications import notification_routes
 from routers.profile import profile_routes
 from src.database.mongo import connect_to_mongo, close_mongo_connection
+from src.utils.db import ensure_indexes
+from src.services.location_services import close_places_client
+from src.services.chat_services import backfill_message_counts, close_message_writer
 from routers.location_search import user_location
 from routers.admin import admin_routes
 from routers.reports import report_routes
@@ -12,11 +16,15 @@ from routers.reports import report_routes
 # Lifespan function to manage MongoDB connection
 async def lifespan(app: FastAPI):
     await connect_to_mongo()   # Connect to MongoDB on startup
+    await ensure_indexes()     # Create indexes backing the hot queries
+    await backfill_message_counts()  # One-time: store message_count on older conversations
     yield
+    await close_message_writer()    # Flush messages still waiting in the write batch
+    await close_places_client()     # Release pooled Google Places connections
     await close_mongo_connection()  # Close MongoDB on shutdown
 
 # Create FastAPI app with lifespan
-app = FastAPI(title="Localoop API", lifespan=lifespan)
+app = FastAPI(title="Localoop API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
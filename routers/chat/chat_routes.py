@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from datetime import datetime
 from src.services.chat_services import (
@@ -9,9 +9,10 @@ from src.services.chat_services import (
     send_message,
     get_conversation_by_id,
     delete_conversation_by_id,
-    delete_message 
+    delete_message,
+    encode_message_cursor
 )
-from src.utils.dependencies import get_current_user
+from src.utils.dependencies import get_current_user, get_current_user_claims
 from src.services.websocket_manager import manager
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
@@ -20,11 +21,15 @@ router = APIRouter(prefix="/chat", tags=["Chat"])
 # REQUEST SCHEMAS
 # -------------------------
 class CreateConversationSchema(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     title: str
     body: str
     category: str  # water, electricity, maintenance, crime, places, general
 
 class SendMessageSchema(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     content: str
     reply_to_id: Optional[str] = None
 
@@ -85,14 +90,15 @@ async def get_conversations(
 async def create_new_conversation(
     location_id: str,
     data: CreateConversationSchema,
-    user_id: str = Depends(get_current_user)
+    user: dict = Depends(get_current_user_claims)
 ):
     conversation = await create_conversation(
         location_id=location_id,
         title=data.title,
         body=data.body,
         category=data.category,
-        author_id=user_id
+        author_id=user["id"],
+        author_name=user["name"]
     )
     
     if not conversation:
@@ -124,19 +130,23 @@ async def get_messages(
         before=before
     )
     
+    # Oldest message on this page is where the next (older) page starts
+    next_cursor = encode_message_cursor(messages[0]["timestamp"], messages[0]["id"]) if messages else None
+    
     return {
         "messages": messages or [],
         "conversation": conversation,
         "page": page,
         "limit": limit,
-        "has_more": len(messages or []) == limit
+        "has_more": len(messages or []) == limit,
+        "next_cursor": next_cursor
     }
 
 @router.post("/conversations/{conversation_id}/messages", response_model=dict)
 async def send_message_to_conversation(
     conversation_id: str,
     data: SendMessageSchema,
-    user_id: str = Depends(get_current_user)
+    user: dict = Depends(get_current_user_claims)
 ):
     conversation = await get_conversation_by_id(conversation_id)
     if not conversation:
@@ -145,8 +155,9 @@ async def send_message_to_conversation(
     message = await send_message(
         conversation_id=conversation_id,
         content=data.content,
-        author_id=user_id,
-        reply_to_id=data.reply_to_id
+        author_id=user["id"],
+        reply_to_id=data.reply_to_id,
+        author_name=user["name"]
     )
     
     if not message:
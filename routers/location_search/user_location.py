@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from src.services.location_services import (
     get_user_locations,
+    count_user_locations,
     add_user_location,
     remove_user_location,
     get_location_status,
@@ -73,14 +74,14 @@ async def add_location(
     data: AddLocationSchema,
     user_id: str = Depends(get_current_user)
 ):
-    current_locations = await get_user_locations(user_id)
-    if current_locations and len(current_locations) >= 4:
+    current_count = await count_user_locations(user_id, limit=4)
+    if current_count >= 4:
         raise HTTPException(
             status_code=400,
             detail={
                 "code": "MAX_LOCATIONS_REACHED",
                 "message": "You can only join up to 4 locations",
-                "current_count": len(current_locations),
+                "current_count": current_count,
                 "max_allowed": 4
             }
         )
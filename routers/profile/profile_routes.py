@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel, Field
 from typing import Optional, Any
@@ -217,12 +218,16 @@ async def get_active_sessions(user_id: str = Depends(get_current_user)):
     Get list of active sessions for the user.
     Useful for showing user where they're logged in.
     """
-    from src.services.refresh_token_services import get_user_active_sessions
+    from src.services.refresh_token_services import get_user_active_sessions, count_user_active_sessions
     
     try:
-        sessions = await get_user_active_sessions(user_id)  # You'll need to implement this
+        # The list is capped to the most recent sessions; the count is the true total
+        sessions, active_sessions = await asyncio.gather(
+            get_user_active_sessions(user_id),
+            count_user_active_sessions(user_id)
+        )
         return {
-            "active_sessions": len(sessions),
+            "active_sessions": active_sessions,
             "sessions": sessions
         }
     except Exception as e:
@@ -242,11 +247,11 @@ async def revoke_specific_session(
     """
     from src.services.refresh_token_services import revoke_refresh_token
     
-    # First verify this JTI belongs to the current user
-    from src.services.refresh_token_services import get_refresh_token
-    token_info = await get_refresh_token(jti)
+    # First verify this JTI belongs to the current user (read-only; never touches last_used)
+    from src.services.refresh_token_services import get_refresh_token_with_user_check
+    token_info = await get_refresh_token_with_user_check(jti, user_id)
     
-    if not token_info or str(token_info["user_id"]) != user_id:
+    if not token_info:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
@@ -0,0 +1,10 @@
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    """Application settings, read once from the environment / .env file."""
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore", frozen=True)
+
+    google_client_id: Optional[str] = None
+
+settings = Settings()
@@ -1,7 +1,7 @@
 import os
 import logging
-from typing import List, Dict, Any, Optional
-from motor.motor_asyncio import AsyncIOMotorClient
+from typing import List, Dict, Any, Optional, Union
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from pymongo.collection import Collection
 from bson import ObjectId
 from dotenv import load_dotenv
@@ -25,6 +25,7 @@ if not logger.handlers:
 # ---------------------
 class DBContext:
     client: Optional[AsyncIOMotorClient] = None
+    db: Optional[AsyncIOMotorDatabase] = None
 
 db_context = DBContext()
 
@@ -34,13 +35,29 @@ db_context = DBContext()
 async def connect_to_mongo():
     """Connects to MongoDB."""
     uri = os.getenv("DATABASE_URL", "mongodb://localhost:27017/")
-    db_context.client = AsyncIOMotorClient(uri)
-    logger.info(f"Connected to MongoDB at {uri}")
+    # One pooled client for the whole process, tunable per deployment via env
+    db_context.client = AsyncIOMotorClient(
+        uri,
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 200)),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 20)),
+        waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 1000)),
+        maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+        serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        # zlib ships with Python; zstd/snappy need the zstandard/python-snappy packages
+        compressors=os.getenv("MONGO_COMPRESSORS", "zlib"),
+        zlibCompressionLevel=3,
+        retryWrites=True
+    )
+    # Resolve the database handle once; every helper reuses it via get_db()
+    db_context.db = db_context.client[os.getenv("DATABASE_NAME", "localoop_db")]
+    logger.info("Connected to MongoDB at %s", uri)
 
 async def close_mongo_connection():
     """Closes MongoDB connection."""
     if db_context.client:
         db_context.client.close()
+        db_context.client = None
+        db_context.db = None
         logger.info("MongoDB connection closed.")
 
 # ---------------------
@@ -48,10 +65,9 @@ async def close_mongo_connection():
 # ---------------------
 async def get_db():
     """Returns the MongoDB database instance."""
-    if not db_context.client:
+    if db_context.db is None:
         raise Exception("Database not initialized. Call connect_to_mongo() first.")
-    db_name = os.getenv("DATABASE_NAME", "localoop_db")
-    return db_context.client[db_name]
+    return db_context.db
 
 # ---------------------
 # Helper functions
@@ -81,20 +97,25 @@ async def fetch(
 async def insert(collection_name: str, data: dict) -> str:
     db = await get_db()
     result = await db[collection_name].insert_one(data)
-    logger.debug(f"Inserted document into '{collection_name}' with _id={result.inserted_id}")
+    logger.debug("Inserted document into '%s' with _id=%s", collection_name, result.inserted_id)
     return str(result.inserted_id)
 
-async def update(collection_name: str, record_id: str, updated_data: dict) -> bool:
+async def update(collection_name: str, record_id: Union[str, dict], updated_data: dict) -> bool:
     db = await get_db()
-    filter_ = {"_id": ObjectId(record_id)}
+    # A string is a Mongo _id; a dict is used as the filter directly
+    filter_ = record_id if isinstance(record_id, dict) else {"_id": ObjectId(record_id)}
     update_doc = {"$set": updated_data}
     result = await db[collection_name].update_one(filter_, update_doc)
-    logger.debug(f"Updated {result.modified_count} document(s) in '{collection_name}' with _id={record_id}")
-    return result.modified_count > 0
+    logger.debug(
+        "Matched %s / updated %s document(s) in '%s' matching %s",
+        result.matched_count, result.modified_count, collection_name, filter_
+    )
+    # Success means the target exists; an idempotent write (same values) modifies nothing
+    return result.matched_count > 0
 
 async def delete(collection_name: str, record_id: str) -> bool:
     db = await get_db()
     filter_ = {"_id": ObjectId(record_id)}
     result = await db[collection_name].delete_one(filter_)
-    logger.debug(f"Deleted {result.deleted_count} document(s) from '{collection_name}' with _id={record_id}")
+    logger.debug("Deleted %s document(s) from '%s' with _id=%s", result.deleted_count, collection_name, record_id)
     return result.deleted_count > 0
@@ -1,9 +1,12 @@
 from typing import Optional, Dict, Any, List
 from bson import ObjectId
 from datetime import datetime, timedelta
-from src.utils.db import fetch, update, update_many
-from src.utils.serialize_helper import serialize_doc
+import asyncio
+from src.utils.db import fetch, count, aggregate, update, update_many, find_one_and_update, increment
+from src.utils.serialize_helper import serialize_doc, serialize_docs
 from src.services.refresh_token_services import revoke_all_user_tokens
+from src.services.chat_services import adjust_message_counts, get_users_info_bulk
+from src.services.profile_services import invalidate_user_profile
 
 # -------------------------
 # ADMIN ROLE MANAGEMENT
@@ -11,7 +14,7 @@ from src.services.refresh_token_services import revoke_all_user_tokens
 async def check_user_admin_status(user_id: str) -> bool:
     """Check if user is an admin."""
     try:
-        users = await fetch("users", {"_id": ObjectId(user_id), "is_active": True})
+        users = await fetch("users", {"_id": ObjectId(user_id), "is_active": True}, limit=1, projection={"is_admin": 1})
         if not users:
             return False
         
@@ -34,6 +37,8 @@ async def make_user_admin(admin_user_id: str, target_user_id: str) -> Dict[str,
             "promoted_at": datetime.utcnow(),
             "promoted_by": admin_user_id
         })
+        if success:
+            invalidate_user_profile(target_user_id)
         
         return {"success": success, "error": None if success else "Failed to promote user"}
     except Exception as e:
@@ -55,6 +60,8 @@ async def remove_admin_status(admin_user_id: str, target_user_id: str) -> Dict[s
             "demoted_at": datetime.utcnow(),
             "demoted_by": admin_user_id
         })
+        if success:
+            invalidate_user_profile(target_user_id)
         
         return {"success": success, "error": None if success else "Failed to demote user"}
     except Exception as e:
@@ -73,7 +80,7 @@ async def get_all_users(admin_user_id: str, page: int = 1, limit: int = 50) -> D
         skip = (page - 1) * limit
         
         # Get total count
-        total_users = len(await fetch("users", {}))
+        total_users = await count("users", {})
         
         # Get users with pagination
         users = await fetch("users", {}, limit=limit, skip=skip)
@@ -141,6 +148,9 @@ async def ban_user(admin_user_id: str, target_user_id: str, reason: str = None)
                 {"author_id": target_user_id, "is_deleted": {"$ne": True}}, 
                 {"is_deleted": True, "deleted_at": now, "deletion_reason": "user_banned"}
             )
+            await adjust_message_counts(
+                {"author_id": target_user_id, "deletion_reason": "user_banned", "deleted_at": now}, -1
+            )
         
         return {"success": success, "error": None if success else "Failed to ban user"}
     except Exception as e:
@@ -171,6 +181,9 @@ async def unban_user(admin_user_id: str, target_user_id: str) -> Dict[str, Any]:
         })
         
         if success:
+            # Count the messages to restore per conversation before flipping them back
+            await adjust_message_counts({"author_id": target_user_id, "deletion_reason": "user_banned"}, 1)
+            
             # Reactivate user's content
             await update_many("conversations", 
                 {"author_id": target_user_id, "deletion_reason": "user_banned"}, 
@@ -230,17 +243,17 @@ async def get_system_metrics(admin_user_id: str) -> Dict[str, Any]:
             return {"success": False, "error": "Admin access required"}
         
         # User metrics
-        total_users = len(await fetch("users", {}))
-        active_users = len(await fetch("users", {"is_active": True}))
-        banned_users = len(await fetch("users", {"is_active": False, "deletion_reason": "admin_ban"}))
-        admin_users = len(await fetch("users", {"is_admin": True, "is_active": True}))
+        total_users = await count("users", {})
+        active_users = await count("users", {"is_active": True})
+        banned_users = await count("users", {"is_active": False, "deletion_reason": "admin_ban"})
+        admin_users = await count("users", {"is_admin": True, "is_active": True})
         
         # Content metrics
         try:
-            total_conversations = len(await fetch("conversations", {}))
-            active_conversations = len(await fetch("conversations", {"is_active": True}))
-            total_messages = len(await fetch("messages", {}))
-            active_messages = len(await fetch("messages", {"is_deleted": {"$ne": True}}))
+            total_conversations = await count("conversations", {})
+            active_conversations = await count("conversations", {"is_active": True})
+            total_messages = await count("messages", {})
+            active_messages = await count("messages", {"is_deleted": {"$ne": True}})
         except:
             # If collections don't exist yet
             total_conversations = active_conversations = 0
@@ -248,8 +261,8 @@ async def get_system_metrics(admin_user_id: str) -> Dict[str, Any]:
         
         # Location metrics
         try:
-            total_locations = len(await fetch("user_locations", {}))
-            active_locations = len(await fetch("user_locations", {"is_active": True}))
+            total_locations = await count("user_locations", {})
+            active_locations = await count("user_locations", {"is_active": True})
             # Get unique location IDs
             unique_locations = set()
             all_user_locs = await fetch("user_locations", {})
@@ -281,9 +294,9 @@ async def get_system_metrics(admin_user_id: str) -> Dict[str, Any]:
         # Recent activity (users created in last 7 days)
         week_ago = datetime.utcnow() - timedelta(days=7)
         try:
-            recent_users = len(await fetch("users", {
+            recent_users = await count("users", {
                 "_id": {"$gte": ObjectId.from_datetime(week_ago)}
-            }))
+            })
         except:
             recent_users = 0
         
@@ -331,38 +344,39 @@ async def get_all_locations(admin_user_id: str, page: int = 1, limit: int = 50)
         
         # Get all user locations with user info
         locations = await fetch("user_locations", {}, limit=limit, skip=skip, sort=[("created_at", -1)])
-        total_locations = len(await fetch("user_locations", {}))
+        total_locations = await count("user_locations", {})
+        
+        location_ids = [loc["id"] for loc in locations]
+        
+        # Owners (one bulk users query, cache-backed) and activity stats for the
+        # whole page, concurrently; activity sums the stored per-conversation
+        # message_count instead of recounting messages
+        users_by_id, activity_rows = await asyncio.gather(
+            get_users_info_bulk([loc["user_id"] for loc in locations if loc.get("user_id")]),
+            aggregate("conversations", [
+                {"$match": {"location_id": {"$in": location_ids}}},
+                {"$group": {
+                    "_id": "$location_id",
+                    "conversation_count": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}},
+                    "message_count": {"$sum": {"$ifNull": ["$message_count", 0]}}
+                }}
+            ])
+        ) if location_ids else ({}, [])
+        activity = {row["_id"]: row for row in activity_rows}
         
         location_list = []
         for loc in locations:
             loc_doc = serialize_doc(loc)
             
-            # Get user info for this location
-            try:
-                users = await fetch("users", {"_id": ObjectId(loc_doc["user_id"])})
-                if users:
-                    user = users[0]
-                    loc_doc["user_email"] = user.get("email", "Unknown")
-                    loc_doc["user_name"] = f"{user.get('display_name', '')} {user.get('last_name', '')}".strip()
-                else:
-                    loc_doc["user_email"] = "Unknown"
-                    loc_doc["user_name"] = "Unknown User"
-            except:
-                loc_doc["user_email"] = "Unknown"
-                loc_doc["user_name"] = "Unknown User"
+            # User info for this location
+            user = users_by_id.get(loc_doc.get("user_id"))
+            loc_doc["user_email"] = (user["email"] if user else None) or "Unknown"
+            loc_doc["user_name"] = user["name"] if user else "Unknown User"
             
-            # Get activity stats for this location
-            try:
-                conversation_count = len(await fetch("conversations", {"location_id": loc_doc["id"], "is_active": True}))
-                message_count = len(await fetch("messages", {
-                    "conversation_id": {"$in": [conv["id"] for conv in await fetch("conversations", {"location_id": loc_doc["id"]})]},
-                    "is_deleted": {"$ne": True}
-                }))
-                loc_doc["conversation_count"] = conversation_count
-                loc_doc["message_count"] = message_count
-            except:
-                loc_doc["conversation_count"] = 0
-                loc_doc["message_count"] = 0
+            # Activity stats for this location
+            stats = activity.get(loc_doc["id"], {})
+            loc_doc["conversation_count"] = stats.get("conversation_count", 0)
+            loc_doc["message_count"] = stats.get("message_count", 0)
             
             location_list.append(loc_doc)
         
@@ -505,18 +519,18 @@ async def get_conversations_by_location(admin_user_id: str, location_id: str, pa
         )
         
         # Get total count
-        total_conversations = len(await fetch("conversations", {"location_id": location_id}))
-        
-        conv_list = []
-        for conv in conversations:
-            conv_doc = serialize_doc(conv)
-            # Add message count
-            message_count = len(await fetch("messages", {
-                "conversation_id": conv_doc["id"], 
-                "is_deleted": {"$ne": True}
-            }))
+        total_conversations = await count("conversations", {"location_id": location_id})
+        
+        conv_list = serialize_docs(conversations)
+        # message_count is stored on each conversation; only rows the backfill
+        # has not reached yet are counted, concurrently
+        uncounted = [conv_doc for conv_doc in conv_list if "message_count" not in conv_doc]
+        message_counts = await asyncio.gather(*(
+            count("messages", {"conversation_id": conv_doc["id"], "is_deleted": {"$ne": True}})
+            for conv_doc in uncounted
+        ))
+        for conv_doc, message_count in zip(uncounted, message_counts):
             conv_doc["message_count"] = message_count
-            conv_list.append(conv_doc)
         
         return {
             "success": True,
@@ -537,14 +551,8 @@ async def delete_conversation_admin(admin_user_id: str, conversation_id: str, re
         if not await check_user_admin_status(admin_user_id):
             return {"success": False, "error": "Admin access required"}
         
-        # Find conversation by id field (not _id)
-        conversations = await fetch("conversations", {"id": conversation_id, "is_active": True})
-        if not conversations:
-            return {"success": False, "error": "Conversation not found"}
-        
-        # Soft delete conversation
-        record_id = str(conversations[0]["_id"])
-        success = await update("conversations", record_id, {
+        # Soft delete conversation, matched by id field (not _id)
+        success = await update("conversations", {"id": conversation_id, "is_active": True}, {
             "is_active": False,
             "deleted_at": datetime.utcnow(),
             "deletion_reason": "admin_moderation",
@@ -552,7 +560,7 @@ async def delete_conversation_admin(admin_user_id: str, conversation_id: str, re
             "admin_delete_reason": reason or "No reason provided"
         })
         
-        return {"success": success, "error": None if success else "Failed to delete conversation"}
+        return {"success": success, "error": None if success else "Conversation not found"}
     except Exception as e:
         return {"success": False, "error": f"Error deleting conversation: {e}"}
 
@@ -562,22 +570,19 @@ async def delete_message_admin(admin_user_id: str, message_id: str, reason: str
         if not await check_user_admin_status(admin_user_id):
             return {"success": False, "error": "Admin access required"}
         
-        # Find message by id field (not _id)
-        messages = await fetch("messages", {"id": message_id, "is_deleted": {"$ne": True}})
-        if not messages:
-            return {"success": False, "error": "Message not found"}
-        
-        # Soft delete message
-        record_id = str(messages[0]["_id"])
-        success = await update("messages", record_id, {
+        # Soft delete message, matched by id field (not _id)
+        deleted = await find_one_and_update("messages", {"id": message_id, "is_deleted": {"$ne": True}}, {"$set": {
             "is_deleted": True,
             "deleted_at": datetime.utcnow(),
             "deletion_reason": "admin_moderation",
             "deleted_by_admin": admin_user_id,
             "admin_delete_reason": reason or "No reason provided"
-        })
+        }}, projection={"conversation_id": 1})
+        if not deleted:
+            return {"success": False, "error": "Message not found"}
         
-        return {"success": success, "error": None if success else "Failed to delete message"}
+        await increment("conversations", {"id": deleted["conversation_id"]}, {"message_count": -1})
+        return {"success": True, "error": None}
     except Exception as e:
         return {"success": False, "error": f"Error deleting message: {e}"}
 
@@ -603,8 +608,8 @@ async def get_flagged_content(admin_user_id: str) -> Dict[str, Any]:
         
         return {
             "success": True,
-            "recent_conversations": [serialize_doc(conv) for conv in recent_conversations],
-            "recent_messages": [serialize_doc(msg) for msg in recent_messages]
+            "recent_conversations": serialize_docs(recent_conversations),
+            "recent_messages": serialize_docs(recent_messages)
         }
     except Exception as e:
         return {"success": False, "error": f"Error fetching flagged content: {e}"}
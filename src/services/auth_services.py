@@ -1,27 +1,55 @@
 from typing import Optional
 from bson import ObjectId
-from dotenv import load_dotenv  # Add this import
-from src.utils.auth_utils import hash_password, verify_password, generate_token_pair, decode_refresh_token
+from src.utils.auth_utils import (
+    hash_password_async,
+    verify_password_async,
+    dummy_verify_password_async,
+    validate_password_strength,
+    generate_token_pair,
+    decode_refresh_token
+)
 from src.utils.db import fetch, insert, update
-from src.utils.auth_utils import validate_password_strength
 from src.services.refresh_token_services import store_refresh_token
+from src.services.chat_services import invalidate_user_info
+from src.services.profile_services import invalidate_user_profile
 from google.oauth2 import id_token
 from google.auth.transport import requests
-import os
+from cachetools import TTLCache
+import requests as http_requests
+import hashlib
+from src.config import settings
 from src.utils.logger import get_logger
 
-# Load environment variables
-load_dotenv()  
-
 logger = get_logger("DB Manager")
 
+# Google auth: reuse one pooled HTTP session so TLS connections and the
+# certificate cache inside google-auth survive across requests
+_GOOGLE_CLIENT_ID_LOG = (
+    f"Using Google Client ID: {settings.google_client_id[:10]}..."
+    if settings.google_client_id else "No GOOGLE_CLIENT_ID found"
+)
+_GOOGLE_HTTP = requests.Request(session=http_requests.Session())
+
+# Short-lived cache of verified ID tokens so client retries skip re-verification
+_GOOGLE_TOKEN_CACHE = TTLCache(maxsize=1024, ttl=30)
+
+def _verify_google_token(id_token_str: str) -> dict:
+    """Verify a Google ID token, reusing a recent verification of the same token."""
+    key = hashlib.sha256(id_token_str.encode()).hexdigest()
+    id_info = _GOOGLE_TOKEN_CACHE.get(key)
+    if id_info is None:
+        id_info = id_token.verify_oauth2_token(id_token_str, _GOOGLE_HTTP, settings.google_client_id)
+        _GOOGLE_TOKEN_CACHE[key] = id_info
+    return id_info
+
 # -------------------------
 # USER REGISTRATION
 # -------------------------
 async def register_user(email: str, password: str, display_name: str, last_name: str) -> Optional[dict]:
     """Register a new user. Returns token pair if successful."""
-    # Check if user already exists (only active users)
-    existing = await fetch("users", {"email": email, "is_active": {"$ne": False}})
+    # Check if user already exists (only active users); this must stay ahead of
+    # the hash so a taken email costs one indexed lookup, not a bcrypt run
+    existing = await fetch("users", {"email": email, "is_active": {"$ne": False}}, limit=1, projection={"_id": 1})
     if existing:
         return None  # User already exists
 
@@ -32,7 +60,7 @@ async def register_user(email: str, password: str, display_name: str, last_name:
         )
 
     # Hash password
-    hashed_pw = hash_password(password)
+    hashed_pw = await hash_password_async(password)
 
     # Insert user into DB with new soft delete fields
     user_doc = {
@@ -47,7 +75,7 @@ async def register_user(email: str, password: str, display_name: str, last_name:
     
     if user_id:
         # Generate token pair for new user
-        tokens = generate_token_pair(str(user_id), email)
+        tokens = generate_token_pair(str(user_id), email, f"{display_name} {last_name}".strip())
         
         # Store refresh token
         refresh_payload = decode_refresh_token(tokens["refresh_token"])
@@ -68,20 +96,27 @@ async def register_user(email: str, password: str, display_name: str, last_name:
 # -------------------------
 async def authenticate_user(email: str, password: str) -> Optional[dict]:
     """Verify credentials. Returns token pair if successful."""
-    users = await fetch("users", {"email": email, "is_active": True})
+    users = await fetch(
+        "users",
+        {"email": email, "is_active": True},
+        limit=1,
+        projection={"password": 1, "display_name": 1, "last_name": 1}
+    )
     if not users:
+        await dummy_verify_password_async()  # Don't let timing reveal registered emails
         return None  # User not found or soft-deleted
 
     user = users[0]
 
     # Check password
-    if "password" in user and not verify_password(password, user["password"]):
+    if "password" in user and not await verify_password_async(password, user["password"]):
         return None  # Wrong password
 
     user_id = str(user["_id"])
+    user_name = f"{user.get('display_name', '')} {user.get('last_name', '')}".strip()
         
     # Generate token pair
-    tokens = generate_token_pair(user_id, email)
+    tokens = generate_token_pair(user_id, email, user_name)
     
     # Store refresh token
     refresh_payload = decode_refresh_token(tokens["refresh_token"])
@@ -110,11 +145,14 @@ async def get_user_by_email(email: str) -> Optional[dict]:
 async def update_display_name(user_id: str, new_display_name: str) -> bool:
     """Update a user's display name."""
     # Optional: check if user exists
-    users = await fetch("users", {"_id": ObjectId(user_id)})
+    users = await fetch("users", {"_id": ObjectId(user_id)}, limit=1, projection={"_id": 1})
     if not users:
         return False
 
     success = await update("users", user_id, {"display_name": new_display_name})
+    if success:
+        invalidate_user_info(user_id)
+        invalidate_user_profile(user_id)
     return success
 
 # -------------------------
@@ -124,12 +162,9 @@ async def authenticate_google_user(id_token_str: str) -> dict:
     """Verify Google ID token, create/find user, return token pair."""
     try:
         # Add some logging to debug
-        google_client_id = os.getenv("GOOGLE_CLIENT_ID")
-        logger.info(f"Using Google Client ID: {google_client_id[:10]}..." if google_client_id else "No GOOGLE_CLIENT_ID found")
+        logger.info(_GOOGLE_CLIENT_ID_LOG)
         
-        id_info = id_token.verify_oauth2_token(
-            id_token_str, requests.Request(), google_client_id
-        )
+        id_info = _verify_google_token(id_token_str)
         
         email = id_info.get("email")
         google_id = id_info.get("sub")
@@ -150,13 +185,15 @@ async def authenticate_google_user(id_token_str: str) -> dict:
             }
             user_id = await insert("users", user_doc)
             user_id = str(user_id)
+            user_name = display_name
             logger.info(f"Created new Google user with ID: {user_id}")
         else:
             user_id = str(users[0]["_id"])
+            user_name = f"{users[0].get('display_name', '')} {users[0].get('last_name', '')}".strip()
             logger.info(f"Found existing user with ID: {user_id}")
 
         # Generate token pair
-        tokens = generate_token_pair(user_id, email)
+        tokens = generate_token_pair(user_id, email, user_name)
         
         # Store refresh token
         refresh_payload = decode_refresh_token(tokens["refresh_token"])
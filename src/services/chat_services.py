@@ -1,13 +1,34 @@
 from typing import Optional, List, Dict
 from datetime import datetime
 from bson import ObjectId
-from src.utils.db import fetch, insert, update, delete
+from functools import lru_cache
+from cachetools import TTLCache
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+import asyncio
+import base64
+from src.utils.db import (
+    fetch, iter_fetch, exists, count, aggregate, iter_aggregate, insert, insert_many, update, upsert,
+    delete, update_many, increment, find_one_and_update, bulk_update
+)
 from src.utils.serialize_helper import serialize_doc
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields returned by the conversation list; moderation bookkeeping stays server-side
+_CONVERSATION_LIST_FIELDS = {
+    "_id": 0, "id": 1, "location_id": 1, "title": 1, "body": 1, "category": 1,
+    "author_id": 1, "author_name": 1, "created_at": 1, "last_activity": 1,
+    "is_pinned": 1, "view_count": 1, "message_count": 1
+}
+
+# Deletion/moderation details never shown in a message page
+_MESSAGE_HIDDEN_FIELDS = {
+    "_id": 0, "deleted_at": 0, "deletion_reason": 0, "deleted_by_admin": 0, "admin_delete_reason": 0
+}
+
 # -------------------------
 # CONVERSATION SERVICES
 # -------------------------
@@ -26,42 +47,85 @@ async def get_location_conversations(
         query["category"] = category
     
     skip = (page - 1) * limit
-    
-    try:
-        conversations = await fetch(
-            "conversations",
-            query,
-            skip=skip,
-            limit=limit,
-            sort=[("last_activity", -1), ("created_at", -1)]
-        )
-        
-        if not conversations:
-            return []
 
-        formatted = []
-        for conv in conversations:
-            conv = serialize_doc(conv)
-            conv["message_count"] = await count_conversation_messages(conv["id"])
-            conv["is_unread"] = await has_unread_messages(conv["id"], user_id) if user_id else False
-            formatted.append(conv)
+    # One round-trip: page the conversations (message_count is stored on each
+    # conversation) and join unread state server-side instead of querying per conversation
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"last_activity": -1, "created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": _CONVERSATION_LIST_FIELDS},
+        {"$addFields": {"message_count": {"$ifNull": ["$message_count", 0]}}},
+        *(_unread_stages(user_id) if user_id else [{"$addFields": {"is_unread": False}}]),
+        {"$project": {"_activity": 0, "_last_read": 0, "_unread": 0}}
+    ]
 
-        return formatted
+    try:
+        transform = serialize_doc
+        return [
+            transform(conv)
+            async for conv in iter_aggregate("conversations", pipeline, batch_size=limit)
+        ]
 
     except Exception as e:
         logger.error(f"Error fetching conversations for location {location_id}: {e}")
         return None
 
 
+def _unread_stages(user_id: str) -> List[dict]:
+    """Aggregation stages computing is_unread with the same rules as has_unread_messages."""
+    return [
+        {"$lookup": {
+            "from": "user_conversation_activity",
+            "let": {"cid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$conversation_id", "$$cid"]}, "user_id": user_id}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "last_read": 1}}
+            ],
+            "as": "_activity"
+        }},
+        {"$addFields": {"_last_read": {"$arrayElemAt": ["$_activity.last_read", 0]}}},
+        {"$lookup": {
+            "from": "messages",
+            "let": {"cid": "$id", "last_read": "$_last_read", "has_activity": {"$gt": [{"$size": "$_activity"}, 0]}},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$conversation_id", "$$cid"]},
+                    {"$ne": ["$is_deleted", True]},
+                    # No activity record: any message counts as unread
+                    {"$or": [
+                        {"$not": ["$$has_activity"]},
+                        {"$and": [{"$gt": ["$timestamp", "$$last_read"]}, {"$ne": ["$author_id", user_id]}]}
+                    ]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "_unread"
+        }},
+        {"$addFields": {"is_unread": {"$cond": [
+            # Activity record without last_read is treated as unread
+            {"$and": [{"$gt": [{"$size": "$_activity"}, 0]}, {"$not": [{"$ifNull": ["$_last_read", False]}]}]},
+            True,
+            {"$gt": [{"$size": "$_unread"}, 0]}
+        ]}}}
+    ]
+
+
 async def create_conversation(
     location_id: str, 
     title: str, 
     body: str, 
     category: str, 
-    author_id: str
+    author_id: str,
+    author_name: Optional[str] = None
 ) -> Optional[Dict]:
-    author_info = await get_user_info(author_id)
-    author_name = author_info.get("name", "Unknown User") if author_info else "Unknown User"
+    # The access token carries the name; only older tokens need the lookup
+    if not author_name:
+        author_info = await get_user_info(author_id)
+        author_name = author_info.get("name", "Unknown User") if author_info else "Unknown User"
     
     conversation_id = str(uuid.uuid4())
     now = datetime.utcnow()
@@ -69,8 +133,8 @@ async def create_conversation(
     new_conversation = {
         "id": conversation_id,
         "location_id": location_id,
-        "title": title.strip(),
-        "body": body.strip(),
+        "title": title,
+        "body": body,
         "category": category,
         "author_id": author_id,
         "author_name": author_name,
@@ -79,6 +143,7 @@ async def create_conversation(
         "is_active": True,
         "is_pinned": False,
         "view_count": 0,
+        "message_count": 0,
         # NEW: Report tracking fields
         "report_count": 0,
         "is_flagged": False,
@@ -89,7 +154,6 @@ async def create_conversation(
         created_id = await insert("conversations", new_conversation)
         if created_id:
             result = serialize_doc(new_conversation)
-            result["message_count"] = 0
             result["is_unread"] = False
             return result
         return None
@@ -106,7 +170,8 @@ async def get_conversation_by_id(conversation_id: str) -> Optional[Dict]:
             return None
         
         conversation = serialize_doc(conversations[0])
-        conversation["message_count"] = await count_conversation_messages(conversation_id)
+        if "message_count" not in conversation:
+            conversation["message_count"] = await count_conversation_messages(conversation_id)
         return conversation
 
     except Exception as e:
@@ -123,32 +188,41 @@ async def get_conversation_messages(
     limit: int = 50, 
     before: Optional[str] = None
 ) -> Optional[List[Dict]]:
+    """Get a page of messages, oldest-first.
+
+    `before` is a cursor from encode_message_cursor (or, for older clients,
+    a message id); pages then continue strictly below that (timestamp, id)
+    position instead of skipping over earlier pages.
+    """
     query = {"conversation_id": conversation_id}
     
-    if before:
-        try:
-            before_message = await fetch("messages", {"id": before})
-            if before_message:
-                before_timestamp = before_message[0]["timestamp"]
-                query["timestamp"] = {"$lt": before_timestamp}
-        except Exception:
-            pass
+    position = await _resolve_message_cursor(before) if before else None
+    if position:
+        before_timestamp, before_id = position
+        query["$or"] = [
+            {"timestamp": {"$lt": before_timestamp}},
+            {"timestamp": before_timestamp, "id": {"$lt": before_id}}
+        ]
     
+    # Offset paging is only kept for clients that still page without a cursor
     skip = (page - 1) * limit if not before else 0
     
     try:
-        messages = await fetch(
-            "messages",
-            query,
-            skip=skip,
-            limit=limit,
-            sort=[("timestamp", -1)]
-        )
-        
-        if not messages:
-            return []
-
-        formatted = [serialize_doc(msg) for msg in messages]
+        transform = serialize_doc
+        formatted = [
+            transform(msg)
+            async for msg in iter_fetch(
+                "messages",
+                query,
+                skip=skip,
+                limit=limit,
+                sort=[("timestamp", -1), ("id", -1)],
+                projection=_MESSAGE_HIDDEN_FIELDS,
+                batch_size=limit
+            )
+        ]
+
+        # Fetched newest-first for the limit; return oldest-first
         formatted.reverse()
         return formatted
 
@@ -157,14 +231,38 @@ async def get_conversation_messages(
         return None
 
 
+def encode_message_cursor(timestamp: str, message_id: str) -> str:
+    """Build the opaque pagination cursor for a serialized message."""
+    return base64.urlsafe_b64encode(f"{timestamp}|{message_id}".encode()).decode()
+
+
+async def _resolve_message_cursor(before: str) -> Optional[tuple]:
+    """Turn a `before` cursor (or legacy message id) into a (timestamp, id) position."""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(before.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), message_id
+    except Exception:
+        pass
+
+    try:
+        messages = await fetch("messages", {"id": before}, limit=1, projection={"timestamp": 1, "id": 1})
+        if messages:
+            return messages[0]["timestamp"], messages[0]["id"]
+    except Exception:
+        pass
+    return None
+
+
 async def send_message(
     conversation_id: str, 
     content: str, 
     author_id: str, 
-    reply_to_id: Optional[str] = None
+    reply_to_id: Optional[str] = None,
+    author_name: Optional[str] = None
 ) -> Optional[Dict]:
-    author_info = await get_user_info(author_id)
-    author_name = author_info.get("name", "Unknown User") if author_info else "Unknown User"
+    if not author_name:
+        author_info = await get_user_info(author_id)
+        author_name = author_info.get("name", "Unknown User") if author_info else "Unknown User"
     
     message_id = str(uuid.uuid4())
     now = datetime.utcnow()
@@ -172,7 +270,7 @@ async def send_message(
     new_message = {
         "id": message_id,
         "conversation_id": conversation_id,
-        "content": content.strip(),
+        "content": content,
         "author_id": author_id,
         "author_name": author_name,
         "timestamp": now,
@@ -186,16 +284,127 @@ async def send_message(
     }
 
     try:
-        created_id = await insert("messages", new_message)
-        if not created_id:
-            return None
-        await update_conversation_activity(conversation_id, now)
+        queue = _get_message_queue()
+        if queue.qsize() >= _MESSAGE_QUEUE_LIMIT:
+            # Backlogged: write directly rather than wait behind the queue
+            created_id = await insert("messages", new_message)
+            if not created_id:
+                return None
+            # Bump activity and the stored message count in one atomic update
+            await increment(
+                "conversations",
+                {"id": conversation_id, "is_active": True},
+                {"message_count": 1},
+                {"last_activity": now, "updated_at": now}
+            )
+        else:
+            written = asyncio.get_running_loop().create_future()
+            queue.put_nowait((new_message, written))
+            await written
         return serialize_doc(new_message)
 
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         return None
 
+# -------------------------
+# MESSAGE WRITE BATCHING
+# -------------------------
+
+_MESSAGE_BATCH_WINDOW = 0.01   # seconds a batch stays open after its first message
+_MESSAGE_BATCH_MAX = 500
+_MESSAGE_QUEUE_LIMIT = 5000    # past this depth send_message writes directly
+
+_message_queue: Optional[asyncio.Queue] = None
+_message_writer: Optional[asyncio.Task] = None
+
+
+def _get_message_queue() -> asyncio.Queue:
+    """Return the write queue, starting the background writer on first use."""
+    global _message_queue, _message_writer
+    if _message_queue is None:
+        _message_queue = asyncio.Queue()
+    if _message_writer is None or _message_writer.done():
+        _message_writer = asyncio.create_task(_message_write_loop(_message_queue))
+    return _message_queue
+
+
+async def _message_write_loop(queue: asyncio.Queue) -> None:
+    while True:
+        first = await queue.get()
+        if first is None:
+            return
+        # Let concurrent senders join this batch before writing it
+        await asyncio.sleep(_MESSAGE_BATCH_WINDOW)
+
+        batch = [first]
+        stop = False
+        while len(batch) < _MESSAGE_BATCH_MAX and not queue.empty():
+            item = queue.get_nowait()
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+
+        await _flush_message_batch(batch)
+        if stop:
+            return
+
+
+async def _flush_message_batch(batch: List[tuple]) -> None:
+    """Insert a batch of messages and apply their conversation counters, then wake the senders."""
+    messages = [message for message, _ in batch]
+    failed = set()
+    error = None
+    try:
+        await insert_many("messages", messages)
+    except BulkWriteError as e:
+        # Unordered insert: only the reported documents were not written
+        failed = {write_error["index"] for write_error in e.details.get("writeErrors", [])}
+        error = e
+    except Exception as e:
+        failed = set(range(len(batch)))
+        error = e
+
+    # One $inc per conversation for everything written to it in this batch
+    bumps: Dict[str, tuple] = {}
+    for index, message in enumerate(messages):
+        if index in failed:
+            continue
+        added, last = bumps.get(message["conversation_id"], (0, message["timestamp"]))
+        bumps[message["conversation_id"]] = (added + 1, max(last, message["timestamp"]))
+
+    if bumps:
+        try:
+            await bulk_update("conversations", [
+                UpdateOne(
+                    {"id": conversation_id, "is_active": True},
+                    {"$inc": {"message_count": added}, "$set": {"last_activity": last, "updated_at": last}}
+                )
+                for conversation_id, (added, last) in bumps.items()
+            ])
+        except Exception as e:
+            # Messages are stored; refresh_message_counts can repair the counters
+            logger.error(f"Error updating conversation activity for message batch: {e}")
+
+    for index, (_, written) in enumerate(batch):
+        if written.done():
+            continue  # Sender went away
+        if index in failed:
+            written.set_exception(error)
+        else:
+            written.set_result(True)
+
+
+async def close_message_writer() -> None:
+    """Flush queued messages and stop the background writer."""
+    global _message_writer
+    if _message_writer is None or _message_writer.done():
+        return
+    _message_queue.put_nowait(None)
+    await _message_writer
+    _message_writer = None
+
 # -------------------------
 # NEW: REPORT HELPER FUNCTIONS
 # -------------------------
@@ -211,36 +420,76 @@ async def get_message_by_id(message_id: str) -> Optional[Dict]:
         logger.error(f"Error fetching message {message_id}: {e}")
         return None
 
-async def increment_report_count(target_type: str, target_id: str) -> bool:
-    """Increment report count for conversation or message"""
+async def get_message_with_conversation(message_id: str) -> Optional[Dict]:
+    """Get a message together with its active conversation's location in one round-trip"""
     try:
-        collection = "conversations" if target_type == "conversation" else "messages"
-        
-        # Get current document
-        docs = await fetch(collection, {"id": target_id})
+        docs = await aggregate("messages", [
+            {"$match": {"id": message_id, "is_deleted": {"$ne": True}}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "conversations",
+                "let": {"conversation_id": "$conversation_id"},
+                "pipeline": [
+                    {"$match": {
+                        "$expr": {"$eq": ["$id", "$$conversation_id"]},
+                        "is_active": True
+                    }},
+                    {"$project": {"_id": 0, "location_id": 1}},
+                    {"$limit": 1}
+                ],
+                "as": "conversation"
+            }}
+        ])
         if not docs:
-            return False
-        
-        doc = docs[0]
-        record_id = str(doc["_id"])
-        
-        # Increment report count and set last reported time
-        updates = {
-            "report_count": doc.get("report_count", 0) + 1,
-            "last_reported_at": datetime.utcnow()
-        }
+            return None
+
+        message = docs[0]
+        conversation = message.pop("conversation")
+        message = serialize_doc(message)
+        message["conversation"] = conversation[0] if conversation else None
+        return message
+    except Exception as e:
+        logger.error(f"Error fetching message {message_id} with conversation: {e}")
+        return None
+
+# Reports on one piece of content that auto-flag it
+_AUTO_FLAG_REPORT_COUNT = 3
+
+async def increment_report_count(target_type: str, target_id: str) -> int:
+    """Increment report count for conversation or message; returns the new count (0 if not found)"""
+    try:
+        collection = "conversations" if target_type == "conversation" else "messages"
         
-        # Auto-flag if report count reaches threshold
-        if updates["report_count"] >= 3:
-            updates["is_flagged"] = True
-            logger.warning(f"{target_type.title()} {target_id} auto-flagged due to {updates['report_count']} reports")
+        # Increment report count, set last reported time and auto-flag at the
+        # threshold in one atomic round-trip; is_flagged is left untouched below it
+        doc = await find_one_and_update(
+            collection,
+            {"id": target_id},
+            [
+                {"$set": {
+                    "report_count": {"$add": [{"$ifNull": ["$report_count", 0]}, 1]},
+                    "last_reported_at": datetime.utcnow()
+                }},
+                {"$set": {
+                    "is_flagged": {"$cond": [
+                        {"$gte": ["$report_count", _AUTO_FLAG_REPORT_COUNT]}, True, "$is_flagged"
+                    ]}
+                }}
+            ],
+            projection={"_id": 0, "report_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            return 0
         
-        await update(collection, record_id, updates)
-        return True
+        report_count = doc["report_count"]
+        if report_count >= _AUTO_FLAG_REPORT_COUNT:
+            logger.warning(f"{target_type.title()} {target_id} auto-flagged due to {report_count} reports")
+        return report_count
         
     except Exception as e:
         logger.error(f"Error incrementing report count for {target_type} {target_id}: {e}")
-        return False
+        return 0
 
 async def get_user_display_name(user_id: str) -> str:
     """Get user display name for reports"""
@@ -256,34 +505,86 @@ async def get_user_display_name(user_id: str) -> str:
 
 async def count_conversation_messages(conversation_id: str) -> int:
     try:
-        messages = await fetch("messages", {"conversation_id": conversation_id, "is_deleted": {"$ne": True}})
-        return len(messages) if messages else 0
+        return await count("messages", {"conversation_id": conversation_id, "is_deleted": {"$ne": True}})
     except Exception:
         return 0
 
 
+async def refresh_message_counts(message_filter: Optional[dict] = None) -> None:
+    """Recompute the stored message_count of conversations containing matching messages.
+
+    Overwrites the counters, so only for the one-time backfill and manual repair;
+    live paths must use adjust_message_counts so concurrent $inc writes survive.
+    """
+    await aggregate("messages", [
+        {"$match": message_filter or {}},
+        {"$group": {"_id": "$conversation_id"}},
+        {"$lookup": {
+            "from": "messages",
+            "let": {"cid": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$conversation_id", "$$cid"]}, "is_deleted": {"$ne": True}}},
+                {"$count": "c"}
+            ],
+            "as": "_mc"
+        }},
+        {"$project": {"_id": 0, "id": "$_id", "message_count": {"$ifNull": [{"$arrayElemAt": ["$_mc.c", 0]}, 0]}}},
+        {"$merge": {"into": "conversations", "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ])
+
+
+async def adjust_message_counts(message_filter: dict, sign: int) -> None:
+    """Apply per-conversation $inc deltas for the messages matching the filter.
+
+    sign is -1 after those messages were soft-deleted and +1 before/after they
+    are restored; increments from the batch writer are never overwritten.
+    """
+    groups = await aggregate("messages", [
+        {"$match": message_filter},
+        {"$group": {"_id": "$conversation_id", "n": {"$sum": 1}}}
+    ])
+    if groups:
+        await bulk_update("conversations", [
+            UpdateOne({"id": group["_id"]}, {"$inc": {"message_count": sign * group["n"]}})
+            for group in groups
+        ])
+
+
+async def backfill_message_counts() -> None:
+    """Populate message_count on conversations created before it was stored."""
+    try:
+        if await exists("conversations", {"message_count": {"$exists": False}}):
+            logger.info("Backfilling conversation message counts")
+            await refresh_message_counts()
+            await update_many("conversations", {"message_count": {"$exists": False}}, {"message_count": 0})
+    except Exception as e:
+        # Never block startup; get_conversation_by_id counts on the fly while a field is missing
+        logger.error(f"Message count backfill failed: {e}")
+
+
 async def has_unread_messages(conversation_id: str, user_id: str) -> bool:
     try:
         user_activity = await fetch("user_conversation_activity", {
             "user_id": user_id, 
             "conversation_id": conversation_id
-        })
+        }, limit=1, projection={"last_read": 1})
         
         if not user_activity:
-            return await count_conversation_messages(conversation_id) > 0
+            return await exists("messages", {
+                "conversation_id": conversation_id,
+                "is_deleted": {"$ne": True}
+            })
         
         last_read = user_activity[0].get("last_read")
         if not last_read:
             return True
         
-        recent_messages = await fetch("messages", {
+        return await exists("messages", {
             "conversation_id": conversation_id,
             "timestamp": {"$gt": last_read},
             "author_id": {"$ne": user_id},
             "is_deleted": {"$ne": True}
         })
-        
-        return len(recent_messages) > 0 if recent_messages else False
 
     except Exception as e:
         logger.error(f"Error checking unread messages: {e}")
@@ -293,21 +594,13 @@ async def has_unread_messages(conversation_id: str, user_id: str) -> bool:
 async def mark_conversation_read(conversation_id: str, user_id: str) -> bool:
     try:
         now = datetime.utcnow()
-        existing = await fetch("user_conversation_activity", {
-            "user_id": user_id, 
-            "conversation_id": conversation_id
-        })
-        if existing:
-            record_id = str(existing[0]["_id"])
-            await update("user_conversation_activity", record_id, {"last_read": now, "updated_at": now})
-        else:
-            await insert("user_conversation_activity", {
-                "user_id": user_id,
-                "conversation_id": conversation_id,
-                "last_read": now,
-                "created_at": now,
-                "updated_at": now
-            })
+        # Single atomic upsert; the unique (user_id, conversation_id) index prevents duplicates
+        await upsert(
+            "user_conversation_activity",
+            {"user_id": user_id, "conversation_id": conversation_id},
+            {"last_read": now, "updated_at": now},
+            {"created_at": now}
+        )
         return True
     except Exception as e:
         logger.error(f"Error marking conversation read: {e}")
@@ -316,48 +609,122 @@ async def mark_conversation_read(conversation_id: str, user_id: str) -> bool:
 
 async def update_conversation_activity(conversation_id: str, activity_time: datetime) -> bool:
     try:
-        conversations = await fetch("conversations", {"id": conversation_id, "is_active": True})
-        if not conversations:
-            return False
-        record_id = str(conversations[0]["_id"])
-        await update("conversations", record_id, {"last_activity": activity_time, "updated_at": activity_time})
-        return True
+        return await update(
+            "conversations",
+            {"id": conversation_id, "is_active": True},
+            {"last_activity": activity_time, "updated_at": activity_time}
+        )
     except Exception as e:
         logger.error(f"Error updating conversation activity: {e}")
         return False
 
 
+@lru_cache(maxsize=4096)
+def _oid(user_id: str) -> ObjectId:
+    """Parse a user id once; repeat posters reuse the cached ObjectId."""
+    return ObjectId(user_id)
+
+
+# Author info is denormalized onto every write, so keep it in-process
+_USER_INFO_PROJECTION = {"display_name": 1, "last_name": 1, "email": 1, "avatar_url": 1}
+_user_info_cache = TTLCache(maxsize=10_000, ttl=300)
+_user_info_locks: Dict[str, asyncio.Lock] = {}
+_user_info_lock_holders: Dict[str, int] = {}  # Callers holding or waiting on each lock
+
+
+def _format_user_info(user: dict) -> Dict:
+    return {
+        "id": str(user["_id"]),
+        "name": f"{user.get('display_name', '')} {user.get('last_name', '')}".strip() or "Unknown User",
+        "email": user.get("email", ""),
+        "avatar_url": user.get("avatar_url")
+    }
+
+
+def invalidate_user_info(user_id: str) -> None:
+    """Drop a cached user after their profile changes."""
+    _user_info_cache.pop(user_id, None)
+
+
 async def get_user_info(user_id: str) -> Optional[Dict]:
+    cached = _user_info_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # One lookup per user at a time; concurrent callers wait for its result
+    lock = _user_info_locks.setdefault(user_id, asyncio.Lock())
+    _user_info_lock_holders[user_id] = _user_info_lock_holders.get(user_id, 0) + 1
     try:
-        users = await fetch("users", {"_id": ObjectId(user_id)})
-    except Exception:
-        return None
-    if users:
-        user = serialize_doc(users[0])
-        return {
-            "id": str(user.get("_id")),
-            "name": f"{user.get('display_name', '')} {user.get('last_name', '')}".strip() or "Unknown User",
-            "email": user.get("email", ""),
-            "avatar_url": user.get("avatar_url")
-        }
-    return None
+        async with lock:
+            cached = _user_info_cache.get(user_id)
+            if cached is not None:
+                return cached
+            try:
+                users = await fetch("users", {"_id": _oid(user_id)}, limit=1, projection=_USER_INFO_PROJECTION)
+            except Exception:
+                return None
+            if not users:
+                return None
+            info = _format_user_info(users[0])
+            _user_info_cache[user_id] = info
+            return info
+    finally:
+        # Drop the lock only once nobody else is waiting on it; otherwise a new
+        # caller would create a second lock and run a parallel lookup
+        remaining = _user_info_lock_holders[user_id] - 1
+        if remaining:
+            _user_info_lock_holders[user_id] = remaining
+        else:
+            del _user_info_lock_holders[user_id]
+            if _user_info_locks.get(user_id) is lock:
+                del _user_info_locks[user_id]
+
+
+async def get_users_info_bulk(user_ids: List[str]) -> Dict[str, Dict]:
+    """Get user info for many users with at most one query, keyed by user id."""
+    result = {}
+    missing = []
+    for user_id in set(user_ids):
+        cached = _user_info_cache.get(user_id)
+        if cached is not None:
+            result[user_id] = cached
+        elif ObjectId.is_valid(user_id):
+            missing.append(_oid(user_id))
+
+    if missing:
+        try:
+            users = await fetch("users", {"_id": {"$in": missing}}, limit=len(missing), projection=_USER_INFO_PROJECTION)
+        except Exception as e:
+            logger.error(f"Error fetching user info in bulk: {e}")
+            return result
+        for user in users:
+            info = _format_user_info(user)
+            _user_info_cache[info["id"]] = info
+            result[info["id"]] = info
+    return result
 
 # -------------------------
 # ADMIN/MODERATION FUNCTIONS
 # -------------------------
 
 async def delete_conversation_by_id(conversation_id: str, user_id: str) -> bool:
-    """Soft delete a conversation (mark as inactive)"""
+    """Soft delete a conversation (mark as inactive) and its messages"""
     try:
-        conversations = await fetch("conversations", {"id": conversation_id, "author_id": user_id, "is_active": True})
-        if not conversations:
+        now = datetime.utcnow()
+        # Matching on author_id doubles as the ownership check
+        success = await update(
+            "conversations",
+            {"id": conversation_id, "author_id": user_id, "is_active": True},
+            {"is_active": False, "deleted_at": now}
+        )
+        if not success:
             return False
-        
-        record_id = str(conversations[0]["_id"])
-        await update("conversations", record_id, {
-            "is_active": False,
-            "deleted_at": datetime.utcnow()
-        })
+
+        await update_many(
+            "messages",
+            {"conversation_id": conversation_id, "is_deleted": {"$ne": True}},
+            {"is_deleted": True, "deleted_at": now, "deletion_reason": "conversation_deleted"}
+        )
         return True
     except Exception as e:
         logger.error(f"Error deleting conversation: {e}")
@@ -366,11 +733,15 @@ async def delete_conversation_by_id(conversation_id: str, user_id: str) -> bool:
 
 async def delete_message(message_id: str, user_id: str) -> bool:
     try:
-        messages = await fetch("messages", {"id": message_id, "author_id": user_id, "is_deleted": {"$ne": True}})
-        if not messages:
+        deleted = await find_one_and_update(
+            "messages",
+            {"id": message_id, "author_id": user_id, "is_deleted": {"$ne": True}},
+            {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}},
+            projection={"conversation_id": 1}
+        )
+        if not deleted:
             return False
-        record_id = str(messages[0]["_id"])
-        await update("messages", record_id, {"is_deleted": True, "deleted_at": datetime.utcnow()})
+        await increment("conversations", {"id": deleted["conversation_id"]}, {"message_count": -1})
         return True
     except Exception as e:
         logger.error(f"Error deleting message: {e}")
@@ -1,16 +1,50 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 from bson import ObjectId
-from src.utils.db import fetch, insert, update
-from src.utils.serialize_helper import serialize_doc
+from src.utils.db import fetch, count, insert, update
+from src.utils.serialize_helper import serialize_doc, serialize_docs
 import uuid
 import os
+import re
+import logging
 from dotenv import load_dotenv
+from cachetools import TTLCache
 import httpx
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+logger = logging.getLogger(__name__)
+
+# Fields read by the location list formatter / LocationResponseSchema
+_USER_LOCATION_FIELDS = {
+    "id": 1, "name": 1, "coordinates": 1, "unread_count": 1, "status": 1,
+    "joined_at": 1, "last_activity": 1, "is_active": 1
+}
+
+# Fields needed to answer a place search from saved locations
+# Only public place details; a row's own id keys that user's private location chat
+_LOCAL_SEARCH_FIELDS = {"_id": 0, "name": 1, "coordinates": 1}
+
+
+def _parse_coordinates(coordinates: Optional[dict]) -> Optional[Tuple[float, float]]:
+    """Normalize a {lat, lng} / {latitude, longitude} dict to a (lat, lng) tuple."""
+    if not coordinates:
+        return None
+    lat = coordinates.get("lat", coordinates.get("latitude"))
+    lng = coordinates.get("lng", coordinates.get("longitude"))
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def _geo_point(lat: float, lng: float) -> dict:
+    """GeoJSON point for the 2dsphere index (longitude first)."""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
 
 # -------------------------
 # USER LOCATIONS
@@ -18,20 +52,27 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 async def get_user_locations(user_id: str) -> Optional[List[dict]]:
     """Get all active locations for a user"""
-    locations = await fetch("user_locations", {"user_id": user_id, "is_active": True})
+    locations = await fetch(
+        "user_locations",
+        {"user_id": user_id, "is_active": True},
+        sort=[("joined_at", -1)],  # Newest first, served from the index
+        projection=_USER_LOCATION_FIELDS
+    )
     if not locations:
         return None
 
-    formatted = []
-    for loc in locations:
-        loc = serialize_doc(loc)  # ✅ serialize ObjectId and datetime
+    formatted = serialize_docs(locations)  # ✅ serialize ObjectId and datetime
+    for loc in formatted:
         loc["id"] = loc.get("id") or loc.get("_id")
-        formatted.append(loc)
 
-    formatted.sort(key=lambda x: x["joined_at"], reverse=True)
     return formatted
 
 
+async def count_user_locations(user_id: str, limit: int = 0) -> int:
+    """Count a user's active locations, stopping at limit if given."""
+    return await count("user_locations", {"user_id": user_id, "is_active": True}, limit=limit)
+
+
 async def add_user_location(user_id: str, location_name: str, coordinates: dict) -> Optional[dict]:
     """Add a new location for the user"""
     location_id = str(uuid.uuid4())
@@ -49,6 +90,9 @@ async def add_user_location(user_id: str, location_name: str, coordinates: dict)
         "created_at": now,
         "updated_at": now
     }
+    point = _parse_coordinates(coordinates)
+    if point:
+        new_location["geo"] = _geo_point(*point)
 
     created_id = await insert("user_locations", new_location)
     if created_id:
@@ -58,13 +102,11 @@ async def add_user_location(user_id: str, location_name: str, coordinates: dict)
 
 async def remove_user_location(user_id: str, location_id: str) -> bool:
     """Soft delete location by setting is_active=False"""
-    locations = await fetch("user_locations", {"user_id": user_id, "id": location_id, "is_active": True})
-    if not locations:
-        return False
-
-    location_mongo_id = str(locations[0]["_id"])
-    success = await update("user_locations", location_mongo_id, {"is_active": False, "updated_at": datetime.utcnow()})
-    return success
+    return await update(
+        "user_locations",
+        {"user_id": user_id, "id": location_id, "is_active": True},
+        {"is_active": False, "updated_at": datetime.utcnow()}
+    )
 
 
 async def get_location_status(location_id: str, user_id: str) -> Optional[dict]:
@@ -90,20 +132,58 @@ async def get_location_status(location_id: str, user_id: str) -> Optional[dict]:
 # GOOGLE PLACES SEARCH
 # -------------------------
 
+# One pooled client for all Places calls so connections (and TLS sessions) are reused
+_places_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(5.0),
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+# Recent search results, keyed by normalized query and search area. Coordinates are
+# rounded to 3 decimals (~111m) so nearby users share entries.
+_places_cache = TTLCache(maxsize=1000, ttl=3600)
+
+async def close_places_client():
+    """Close the pooled Places HTTP client (app shutdown)."""
+    await _places_client.aclose()
+
 async def search_locations(query: str, coordinates: dict = None, radius_km: int = 10) -> List[dict]:
     """Search locations using Google Places API"""
+    normalized_query = query.lower().strip()
+    if not normalized_query:
+        return []  # Places rejects empty text searches; don't spend a call on it
+
     url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
     params = {"query": query, "key": GOOGLE_API_KEY}
+    lat = lng = None
 
-    if coordinates:
-        lat = coordinates.get("lat") or coordinates.get("latitude")
-        lng = coordinates.get("lng") or coordinates.get("longitude")
+    point = _parse_coordinates(coordinates)
+    if point:
+        lat, lng = point
         params["location"] = f"{lat},{lng}"
         params["radius"] = radius_km * 1000
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, params=params)
-        data = resp.json()
+    cache_key = (
+        normalized_query,
+        round(lat, 3) if lat is not None else None,
+        round(lng, 3) if lng is not None else None,
+        radius_km
+    )
+    cached = _places_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    now = datetime.utcnow()
+
+    # Places other users already saved nearby answer the search without Google
+    if point:
+        results = await _search_saved_locations(normalized_query, lat, lng, radius_km, now)
+        if results:
+            _places_cache[cache_key] = results
+            return results
+
+    resp = await _places_client.get(url, params=params)
+    data = resp.json()
 
     results = []
     for place in data.get("results", []):
@@ -121,10 +201,61 @@ async def search_locations(query: str, coordinates: dict = None, radius_km: int
             },
             "status": "caught_up",
             "unread_count": 0,
-            "joined_at": datetime.utcnow().isoformat(),
-            "last_activity": datetime.utcnow().isoformat(),
+            "joined_at": now,
+            "last_activity": now,
             "is_active": True,
             "type": (place.get("types") or ["unknown"])[0]
         })
 
+    # Only cache real answers; a quota/denied/error response must not blank the area
+    if resp.status_code == 200 and data.get("status") in ("OK", "ZERO_RESULTS"):
+        _places_cache[cache_key] = results
+    return results
+
+
+async def _search_saved_locations(
+    normalized_query: str, lat: float, lng: float, radius_km: int, now: datetime
+) -> List[dict]:
+    """Match saved locations by name prefix within the radius, nearest first."""
+    try:
+        docs = await fetch(
+            "user_locations",
+            {
+                "name": {"$regex": f"^{re.escape(normalized_query)}", "$options": "i"},
+                "is_active": True,
+                "geo": {
+                    "$near": {
+                        "$geometry": _geo_point(lat, lng),
+                        "$maxDistance": radius_km * 1000
+                    }
+                }
+            },
+            limit=20,
+            projection=_LOCAL_SEARCH_FIELDS
+        )
+    except Exception as e:
+        # A missing geo index must not break search; Google is the fallback
+        logger.error(f"Local location search failed: {e}")
+        return []
+
+    results = []
+    seen = set()
+    for doc in docs:
+        # Several users can save the same place; return it once
+        key = (doc.get("name", "").lower(), str(doc.get("coordinates")))
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append({
+            "id": str(uuid.uuid4()),  # Synthetic, as for Places results without a place_id
+            "name": doc.get("name", "Unknown"),
+            "address": "",
+            "coordinates": doc.get("coordinates", {}),
+            "status": "caught_up",
+            "unread_count": 0,
+            "joined_at": now,
+            "last_activity": now,
+            "is_active": True,
+            "type": "saved_location"
+        })
     return results
@@ -1,59 +1,92 @@
 from typing import Optional, Dict, Any
 from bson import ObjectId
-from datetime import datetime
-from src.utils.db import fetch, update, delete, update_many
-from src.utils.auth_utils import verify_password, hash_password, validate_password_strength
-from src.utils.serialize_helper import serialize_doc
+from bson.errors import InvalidId
+from datetime import datetime, timedelta, timezone
+import asyncio
+from cachetools import TTLCache
+from src.utils.db import fetch_one, count, find_one_sorted, update, delete, update_many, db_errors_to_result
+from src.utils.auth_utils import (
+    verify_password_async,
+    dummy_verify_password_async,
+    hash_password_async,
+    validate_password_strength
+)
 from src.services.refresh_token_services import revoke_all_user_tokens
+from src.services.chat_services import invalidate_user_info, adjust_message_counts
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Profiles are read on most authenticated screens and rarely change;
+# every write to a user's profile fields must call invalidate_user_profile
+_profile_cache = TTLCache(maxsize=10_000, ttl=60)
+
+
+def invalidate_user_profile(user_id: str) -> None:
+    """Drop a cached profile after the user document changes."""
+    _profile_cache.pop(user_id, None)
 
 # -------------------------
 # GET USER PROFILE
 # -------------------------
+@db_errors_to_result(None)
 async def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user profile information without sensitive data."""
+    cached = _profile_cache.get(user_id)
+    if cached is not None:
+        return dict(cached)  # Callers may modify the returned dict
+
     try:
         object_id = ObjectId(user_id)
-        users = await fetch("users", {"_id": object_id})
-        if not users:
-            return None
-        
-        user = serialize_doc(users[0])
+    except (InvalidId, TypeError):
+        return None
 
-        profile = {
-            "id": str(user.get("id") or user.get("_id")),
-            "email": user["email"],
-            "display_name": user.get("display_name", ""),
-            "last_name": user.get("last_name", ""),
-            "hasPassword": "password" in user,
-            "is_admin": user.get("is_admin", False)  # Add this line
-        }
-        
-        return profile
-    except Exception as e:
-        print(f"Error in get_user_profile: {e}")
+    # password is only read to derive hasPassword
+    user = await fetch_one(
+        "users",
+        {"_id": object_id},
+        projection={"email": 1, "display_name": 1, "last_name": 1, "is_admin": 1, "password": 1}
+    )
+    if not user:
         return None
+    
+    # Built straight from the projected fields; no generic serialization walk
+    profile = {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "display_name": user.get("display_name", ""),
+        "last_name": user.get("last_name", ""),
+        "hasPassword": "password" in user,
+        "is_admin": user.get("is_admin", False)  # Add this line
+    }
+    
+    _profile_cache[user_id] = profile
+    return dict(profile)
+
 # -------------------------
 # UPDATE USER PROFILE
 # -------------------------
+@db_errors_to_result(False)
 async def update_user_profile(user_id: str, update_data: Dict[str, Any]) -> bool:
     """Update user profile information."""
     try:
-        # Validate ObjectId format
-        if not ObjectId.is_valid(user_id):
-            return False
-            
-        # Add timestamp
-        update_data["updated_at"] = datetime.utcnow()
-        
-        success = await update("users", user_id, update_data)
-        return success
-    except Exception as e:
-        print(f"Error in update_user_profile: {e}")
+        object_id = ObjectId(user_id)
+    except (InvalidId, TypeError):
         return False
+        
+    # Add timestamp
+    update_data["updated_at"] = datetime.now(timezone.utc)
+    
+    success = await update("users", {"_id": object_id}, update_data)
+    if success:
+        invalidate_user_info(user_id)
+        invalidate_user_profile(user_id)
+    return success
 
 # -------------------------
 # CHANGE USER PASSWORD
 # -------------------------
+@db_errors_to_result({"success": False, "error": "Internal server error"})
 async def change_user_password(
     user_id: str, 
     current_password: str, 
@@ -63,56 +96,55 @@ async def change_user_password(
     Change user password after verifying current password.
     IMPORTANT: This should revoke all refresh tokens to force re-login on all devices.
     """
+    # Parse once; invalid ids exit before any I/O
     try:
-        # Validate ObjectId format
-        if not ObjectId.is_valid(user_id):
-            return {"success": False, "error": "Invalid user ID"}
-            
-        # Convert string ID to ObjectId for MongoDB query
         object_id = ObjectId(user_id)
-        users = await fetch("users", {"_id": object_id})
-        if not users:
-            return {"success": False, "error": "User not found"}
-        
-        user = users[0]
-        
-        # Check if user has a password (Google users might not)
-        if "password" not in user:
-            return {"success": False, "error": "Cannot change password for social login users"}
-        
-        # Verify current password
-        if not verify_password(current_password, user["password"]):
-            return {"success": False, "error": "Current password is incorrect"}
-        
-        # Validate new password strength
-        if not validate_password_strength(new_password):
-            return {"success": False, "error": "New password too weak. Must be 8+ chars, with lowercase, uppercase, number, and special char."}
-        
-        # Hash new password and update
-        hashed_new_password = hash_password(new_password)
-        
-        update_data = {
-            "password": hashed_new_password,
-            "updated_at": datetime.utcnow()
-        }
-        
-        success = await update("users", user_id, update_data)
-        
-        if success:
-            # SECURITY: Revoke all refresh tokens to force re-login on all devices
-            # This prevents anyone with old tokens from accessing the account
-            await revoke_all_user_tokens(user_id)
-            print(f"Password changed for user {user_id} - all sessions revoked")
-        
-        return {"success": success, "error": None if success else "Failed to update password"}
-        
-    except Exception as e:
-        print(f"Error in change_user_password: {e}")
-        return {"success": False, "error": "Internal server error"}
+    except (InvalidId, TypeError):
+        return {"success": False, "error": "Invalid user ID"}
+
+    user = await fetch_one("users", {"_id": object_id}, projection={"password": 1})
+    if not user:
+        await dummy_verify_password_async()  # Same cost as a real verify; don't leak which ids exist
+        return {"success": False, "error": "User not found"}
+    
+    # Check if user has a password (Google users might not)
+    if "password" not in user:
+        await dummy_verify_password_async()
+        return {"success": False, "error": "Cannot change password for social login users"}
+    
+    # Validate new password strength first (cheap). The dummy verify keeps this
+    # path as slow as the others, so it can't be told apart by timing.
+    if not validate_password_strength(new_password):
+        await dummy_verify_password_async()
+        return {"success": False, "error": "New password too weak. Must be 8+ chars, with lowercase, uppercase, number, and special char."}
+    
+    # Verify current password
+    if not await verify_password_async(current_password, user["password"]):
+        return {"success": False, "error": "Current password is incorrect"}
+    
+    # Hash new password and update
+    hashed_new_password = await hash_password_async(new_password)
+    
+    update_data = {
+        "password": hashed_new_password,
+        "updated_at": datetime.now(timezone.utc)
+    }
+    
+    success = await update("users", {"_id": object_id}, update_data)
+    
+    if success:
+        invalidate_user_profile(user_id)
+        # SECURITY: Revoke all refresh tokens to force re-login on all devices
+        # This prevents anyone with old tokens from accessing the account
+        await revoke_all_user_tokens(object_id)
+        logger.info(f"Password changed for user {user_id} - all sessions revoked")
+    
+    return {"success": success, "error": None if success else "Failed to update password"}
 
 # -------------------------
 # DELETE USER ACCOUNT
 # -------------------------
+@db_errors_to_result({"success": False, "error": "Internal server error"})
 async def delete_user_account(user_id: str, password: str) -> dict:
     """
     Soft delete a user account:
@@ -123,162 +155,165 @@ async def delete_user_account(user_id: str, password: str) -> dict:
     5. Soft delete all messages authored by the user
     """
     try:
-        # Fetch user
-        users = await fetch("users", {"_id": ObjectId(user_id)})
-        if not users:
-            return {"success": False, "error": "User not found"}
-
-        user = users[0]
-
-        # Verify password (if exists)
-        # For Google users without password, we might want additional verification
-        if "password" in user and not verify_password(password, user["password"]):
-            return {"success": False, "error": "Password is incorrect"}
-        elif "password" not in user and password:  # Google user providing password
-            return {"success": False, "error": "This account uses social login. No password required."}
+        object_id = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return {"success": False, "error": "Invalid user ID"}
 
-        now = datetime.utcnow()
+    # Fetch user
+    user = await fetch_one("users", {"_id": object_id}, projection={"password": 1})
+    if not user:
+        await dummy_verify_password_async()  # Same cost as a real verify; don't leak which ids exist
+        return {"success": False, "error": "User not found"}
 
-        # CRITICAL: Revoke all refresh tokens FIRST
-        # This immediately logs out the user from all devices
-        revoke_success = await revoke_all_user_tokens(user_id)
-        if not revoke_success:
-            print(f"Warning: Failed to revoke some tokens for user {user_id} during account deletion")
+    # Verify password (if exists)
+    # For Google users without password, we might want additional verification
+    if "password" in user and not await verify_password_async(password, user["password"]):
+        return {"success": False, "error": "Password is incorrect"}
+    elif "password" not in user and password:  # Google user providing password
+        await dummy_verify_password_async()
+        return {"success": False, "error": "This account uses social login. No password required."}
 
-        # Soft delete user
-        user_update = {
-            "is_active": False, 
-            "deleted_at": now,
-            "deletion_reason": "user_requested"  # Track why account was deleted
-        }
-        success = await update("users", user_id, user_update)
-        if not success:
-            return {"success": False, "error": "Failed to soft delete user"}
+    now = datetime.now(timezone.utc)
 
-        # Soft delete user's conversations
-        conv_update = {
-            "is_active": False, 
-            "deleted_at": now,
-            "deletion_reason": "user_account_deleted"
-        }
-        conv_result = await update_many("conversations", {"author_id": user_id, "is_active": True}, conv_update)
+    # CRITICAL: Revoke all refresh tokens (immediate logout from all devices)
+    # alongside the user soft delete; the two writes are independent
+    user_update = {
+        "is_active": False, 
+        "deleted_at": now,
+        "deletion_reason": "user_requested"  # Track why account was deleted
+    }
+    revoke_success, success = await asyncio.gather(
+        revoke_all_user_tokens(object_id),
+        update("users", {"_id": object_id}, user_update)
+    )
+    if not revoke_success:
+        logger.warning(f"Failed to revoke some tokens for user {user_id} during account deletion")
+    if not success:
+        return {"success": False, "error": "Failed to soft delete user"}
+    invalidate_user_info(user_id)
+    invalidate_user_profile(user_id)
 
-        # Soft delete user's messages
-        msg_update = {
-            "is_deleted": True, 
-            "deleted_at": now,
-            "deletion_reason": "user_account_deleted"
-        }
-        msg_result = await update_many("messages", {"author_id": user_id, "is_deleted": {"$ne": True}}, msg_update)
+    # Soft delete user's conversations
+    conv_update = {
+        "is_active": False, 
+        "deleted_at": now,
+        "deletion_reason": "user_account_deleted"
+    }
 
-        print(f"Account deletion completed for user {user_id}")
-        print(f"- User marked inactive: {success}")
-        print(f"- Conversations deleted: {conv_result}")
-        print(f"- Messages deleted: {msg_result}")
-        print(f"- All sessions revoked: {revoke_success}")
+    # Soft delete user's messages
+    msg_update = {
+        "is_deleted": True, 
+        "deleted_at": now,
+        "deletion_reason": "user_account_deleted"
+    }
+    conv_result, msg_result = await asyncio.gather(
+        update_many("conversations", {"author_id": user_id, "is_active": True}, conv_update),
+        update_many("messages", {"author_id": user_id, "is_deleted": {"$ne": True}}, msg_update)
+    )
+    # Exactly the messages this call flipped: same reason and timestamp
+    await adjust_message_counts(
+        {"author_id": user_id, "deletion_reason": "user_account_deleted", "deleted_at": now}, -1
+    )
 
-        return {
-            "success": True, 
-            "error": None,
-            "message": "Account and all data successfully deleted. You have been logged out from all devices."
-        }
+    logger.info(
+        f"Account deletion completed for user {user_id}: conversations deleted={conv_result}, "
+        f"messages deleted={msg_result}, sessions revoked={revoke_success}"
+    )
 
-    except Exception as e:
-        print(f"Error in delete_user_account: {e}")
-        return {"success": False, "error": f"Internal server error: {e}"}
+    return {
+        "success": True, 
+        "error": None,
+        "message": "Account and all data successfully deleted. You have been logged out from all devices."
+    }
 
 # -------------------------
 # REACTIVATE USER ACCOUNT (Optional feature)
 # -------------------------
+@db_errors_to_result({"success": False, "error": "Internal server error"})
 async def reactivate_user_account(email: str, password: str) -> dict:
     """
     Reactivate a soft-deleted account within a grace period (e.g., 30 days).
     This is a common feature for account recovery.
     """
-    try:
-        # Find soft-deleted user
-        users = await fetch("users", {
-            "email": email, 
-            "is_active": False,
-            "deleted_at": {"$exists": True}
-        })
-        
-        if not users:
-            return {"success": False, "error": "No deleted account found with this email"}
-        
-        user = users[0]
-        user_id = str(user["_id"])
-        
-        # Check if deletion was too long ago (30 day grace period)
-        deletion_date = user.get("deleted_at")
-        if deletion_date:
-            days_since_deletion = (datetime.utcnow() - deletion_date).days
-            if days_since_deletion > 30:
-                return {"success": False, "error": "Account was deleted too long ago and cannot be recovered"}
-        
-        # Verify password
-        if "password" in user and not verify_password(password, user["password"]):
-            return {"success": False, "error": "Password is incorrect"}
-        
-        # Reactivate user
-        reactivation_data = {
-            "is_active": True,
-            "deleted_at": None,
-            "deletion_reason": None,
-            "reactivated_at": datetime.utcnow()
-        }
-        
-        success = await update("users", user_id, reactivation_data)
-        
-        if success:
-            # Optionally reactivate conversations and messages too
-            await update_many("conversations", 
+    now = datetime.now(timezone.utc)
+
+    # Find a soft-deleted user still inside the 30 day grace period
+    user = await fetch_one("users", {
+        "email": email, 
+        "is_active": False,
+        "deleted_at": {"$gte": now - timedelta(days=30)}
+    }, projection={"password": 1})
+    
+    if not user:
+        await dummy_verify_password_async()  # Same cost as a real verify; don't leak which emails exist
+        return {"success": False, "error": "No recoverable deleted account found with this email"}
+    
+    user_id = str(user["_id"])
+    
+    # Verify password
+    if "password" in user and not await verify_password_async(password, user["password"]):
+        return {"success": False, "error": "Password is incorrect"}
+    
+    # Reactivate user
+    reactivation_data = {
+        "is_active": True,
+        "deleted_at": None,
+        "deletion_reason": None,
+        "reactivated_at": now
+    }
+    
+    # Only flips an account that is still deleted, so concurrent requests reactivate once
+    success = await update("users", {"_id": user["_id"], "is_active": False}, reactivation_data)
+    
+    if success:
+        invalidate_user_profile(user_id)
+        # Count the messages to restore per conversation before flipping them back
+        await adjust_message_counts({"author_id": user_id, "deletion_reason": "user_account_deleted"}, 1)
+        # Optionally reactivate conversations and messages too
+        await asyncio.gather(
+            update_many("conversations", 
                 {"author_id": user_id, "deletion_reason": "user_account_deleted"}, 
                 {"is_active": True, "deleted_at": None, "deletion_reason": None}
-            )
-            
-            await update_many("messages", 
+            ),
+            update_many("messages", 
                 {"author_id": user_id, "deletion_reason": "user_account_deleted"}, 
                 {"is_deleted": False, "deleted_at": None, "deletion_reason": None}
             )
-        
-        return {"success": success, "error": None if success else "Failed to reactivate account"}
-        
-    except Exception as e:
-        print(f"Error in reactivate_user_account: {e}")
-        return {"success": False, "error": "Internal server error"}
+        )
+    
+    return {"success": success, "error": None if success else "Failed to reactivate account"}
 
 # -------------------------
 # GET USER STATISTICS
 # -------------------------
+@db_errors_to_result(None)
 async def get_user_stats(user: dict) -> Optional[Dict[str, Any]]:
+    user_id = str(user.get("id") or user.get("_id"))
     try:
-        user_id = str(user.get("id") or user.get("_id"))
-
-        # Fetch messages for this user (only active messages)
-        messages = await fetch("messages", {
-            "author_id": user_id,
-            "is_deleted": {"$ne": True}  # Only count non-deleted messages
-        })
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return None
 
-        # Sort messages by timestamp ascending (optional, if fetch doesn't guarantee order)
-        messages.sort(key=lambda m: m["timestamp"])
+    # Only active messages count
+    message_filter = {"author_id": user_id, "is_deleted": {"$ne": True}}
 
-        # Get active sessions count (optional monitoring feature)
-        active_tokens = await fetch("refresh_tokens", {
-            "user_id": ObjectId(user_id),
+    # Counts and the latest message are computed server-side, concurrently
+    total_messages, last_message, active_sessions = await asyncio.gather(
+        count("messages", message_filter),
+        find_one_sorted("messages", message_filter, [("timestamp", -1)], projection={"timestamp": 1}),
+        # Active sessions count (optional monitoring feature)
+        count("refresh_tokens", {
+            "user_id": user_oid,
             "is_revoked": False,
-            "expires_at": {"$gt": datetime.utcnow()}
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
         })
+    )
 
-        stats = {
-            "id": user_id,
-            "total_messages": len(messages),
-            "last_activity": messages[-1]["timestamp"] if messages else None,
-            "active_sessions": len(active_tokens)  # How many devices/browsers are logged in
-        }
+    stats = {
+        "id": user_id,
+        "total_messages": total_messages,
+        "last_activity": last_message["timestamp"] if last_message else None,
+        "active_sessions": active_sessions  # How many devices/browsers are logged in
+    }
 
-        return stats
-    except Exception as e:
-        print(f"Error in get_user_stats: {e}")
-        return None
\ No newline at end of file
+    return stats
\ No newline at end of file
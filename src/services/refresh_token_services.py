@@ -1,94 +1,85 @@
-from typing import Optional
-from datetime import datetime, timedelta
+from typing import Optional, Union
+from datetime import datetime, timedelta, timezone
+import asyncio
 from bson import ObjectId
-from src.utils.db import fetch, insert, update, delete
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from src.utils.db import fetch_one, iter_fetch, count, insert, update, update_many, delete_many, find_one_and_update, db_errors_to_result
 from src.utils.auth_utils import decode_refresh_token, generate_token_pair
+from src.services.chat_services import get_user_info
 
-async def store_refresh_token(user_id: str, refresh_token: str, jti: str) -> bool:
+async def store_refresh_token(user_id: Union[str, ObjectId], refresh_token: str, jti: str) -> bool:
     """Store refresh token in database."""
+    now = datetime.now(timezone.utc)
     token_doc = {
         "user_id": ObjectId(user_id),
         "jti": jti,
         "token": refresh_token,
-        "created_at": datetime.utcnow(),
-        "expires_at": datetime.utcnow() + timedelta(days=30),
+        "created_at": now,
+        "expires_at": now + timedelta(days=30),
         "is_revoked": False,
-        "last_used": datetime.utcnow()
+        "last_used": now
     }
     
     result = await insert("refresh_tokens", token_doc)
     return result is not None
 
 async def get_refresh_token(jti: str) -> Optional[dict]:
-    """Get refresh token from database by JTI."""
-    tokens = await fetch("refresh_tokens", {"jti": jti, "is_revoked": False})
-    if not tokens:
-        return None
-    
-    token = tokens[0]
-    # Check if token is expired
-    if token["expires_at"] < datetime.utcnow():
-        await revoke_refresh_token(jti)
-        return None
-    
-    return token
+    """Get a valid (unrevoked, unexpired) refresh token by JTI. Read-only."""
+    return await fetch_one("refresh_tokens", {
+        "jti": jti,
+        "is_revoked": False,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+
+async def use_refresh_token(jti: str) -> Optional[dict]:
+    """Get a valid refresh token by JTI and mark it as used.
+
+    Only for the refresh flow, where the caller has proven possession of the token.
+    """
+    now = datetime.now(timezone.utc)
+    # Lookup, expiry check and usage update in one atomic round-trip
+    return await find_one_and_update(
+        "refresh_tokens",
+        {"jti": jti, "is_revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {"last_used": now}},
+        return_document=ReturnDocument.AFTER
+    )
 
 async def update_refresh_token_usage(jti: str) -> bool:
     """Update last_used timestamp for refresh token."""
-    tokens = await fetch("refresh_tokens", {"jti": jti})
-    if not tokens:
-        return False
-    
-    token_id = str(tokens[0]["_id"])
-    return await update("refresh_tokens", token_id, {"last_used": datetime.utcnow()})
+    return await update("refresh_tokens", {"jti": jti}, {"last_used": datetime.now(timezone.utc)})
 
 async def revoke_refresh_token(jti: str) -> bool:
     """Revoke a refresh token."""
-    tokens = await fetch("refresh_tokens", {"jti": jti})
-    if not tokens:
-        return False
-    
-    token_id = str(tokens[0]["_id"])
-    return await update("refresh_tokens", token_id, {"is_revoked": True})
+    return await update("refresh_tokens", {"jti": jti}, {"is_revoked": True})
 
-async def revoke_all_user_tokens(user_id: str) -> bool:
+@db_errors_to_result(False)
+async def revoke_all_user_tokens(user_id: Union[str, ObjectId]) -> bool:
     """Revoke all refresh tokens for a user (useful for logout from all devices)."""
     try:
-        # This is a bulk update - you might need to implement this in your db utils
-        # For now, we'll fetch all tokens and revoke them individually
-        tokens = await fetch("refresh_tokens", {
-            "user_id": ObjectId(user_id), 
-            "is_revoked": False
-        })
-        
-        success = True
-        for token in tokens:
-            token_id = str(token["_id"])
-            result = await update("refresh_tokens", token_id, {"is_revoked": True})
-            if not result:
-                success = False
-        
-        return success
-    except Exception:
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
         return False
 
+    # An acknowledged write: a failure raises and the decorator returns False.
+    # The filter only matches active tokens and each match is flipped atomically,
+    # so a completed write revoked every one; zero matches means none were active
+    await update_many(
+        "refresh_tokens",
+        {"user_id": user_oid, "is_revoked": False},
+        {"is_revoked": True, "revoked_at": datetime.now(timezone.utc)}
+    )
+    return True
+
+@db_errors_to_result(0)
 async def cleanup_expired_tokens() -> int:
-    """Clean up expired refresh tokens. Returns count of deleted tokens."""
-    try:
-        # This should be run periodically (e.g., daily cron job)
-        expired_tokens = await fetch("refresh_tokens", {
-            "expires_at": {"$lt": datetime.utcnow()}
-        })
-        
-        deleted_count = 0
-        for token in expired_tokens:
-            token_id = str(token["_id"])
-            if await delete("refresh_tokens", token_id):
-                deleted_count += 1
-        
-        return deleted_count
-    except Exception:
-        return 0
+    """Clean up expired refresh tokens. Returns count of deleted tokens.
+
+    The TTL index on expires_at already reaps these in the background;
+    this is only for manual or emergency sweeps.
+    """
+    return await delete_many("refresh_tokens", {"expires_at": {"$lt": datetime.now(timezone.utc)}})
 
 async def refresh_access_token(refresh_token: str) -> Optional[dict]:
     """
@@ -107,8 +98,8 @@ async def refresh_access_token(refresh_token: str) -> Optional[dict]:
     if not all([jti, user_id, user_email]):
         return None
     
-    # Check if token exists and is valid in database
-    stored_token = await get_refresh_token(jti)
+    # Check the token is valid in the database (this also records its use)
+    stored_token = await use_refresh_token(jti)
     if not stored_token:
         return None
     
@@ -117,72 +108,89 @@ async def refresh_access_token(refresh_token: str) -> Optional[dict]:
         await revoke_refresh_token(jti)
         return None
     
-    # Update last used timestamp
-    await update_refresh_token_usage(jti)
-    
-    # Generate new token pair
-    new_tokens = generate_token_pair(user_id, user_email)
+    # Generate new token pair, carrying the current display name forward
+    user_info = await get_user_info(user_id)
+    user_name = user_info.get("name") if user_info else None
+    new_tokens = generate_token_pair(user_id, user_email, user_name)
     
     # Store the new refresh token
     new_payload = decode_refresh_token(new_tokens["refresh_token"])
     new_jti = new_payload.get("jti")
     
     if new_jti:
-        await store_refresh_token(user_id, new_tokens["refresh_token"], new_jti)
-        # Optionally revoke the old refresh token for security
-        await revoke_refresh_token(jti)
+        # Store the new token and revoke the old one (for security) concurrently
+        await asyncio.gather(
+            store_refresh_token(user_id, new_tokens["refresh_token"], new_jti),
+            revoke_refresh_token(jti)
+        )
     
     return new_tokens
 
-async def get_user_active_sessions(user_id: str) -> list:
-    """Get all active sessions for a user with metadata."""
+# Session metadata only; the token string itself never leaves the service
+_SESSION_FIELDS = {
+    "_id": 0, "jti": 1, "created_at": 1, "last_used": 1,
+    "ip_address": 1, "user_agent": 1, "expires_at": 1
+}
+
+@db_errors_to_result([])
+async def get_user_active_sessions(user_id: str, limit: int = 100) -> list:
+    """Get the most recently used active sessions for a user with metadata."""
     try:
-        tokens = await fetch("refresh_tokens", {
-            "user_id": ObjectId(user_id),
-            "is_revoked": False,
-            "expires_at": {"$gt": datetime.utcnow()}
-        })
-        
-        sessions = []
-        for token in tokens:
-            session_info = {
-                "jti": token["jti"],
-                "created_at": token["created_at"].isoformat() if token.get("created_at") else None,
-                "last_used": token["last_used"].isoformat() if token.get("last_used") else None,
-                "ip_address": token.get("ip_address", "Unknown"),
-                "user_agent": token.get("user_agent", "Unknown Device"),
-                "expires_at": token["expires_at"].isoformat() if token.get("expires_at") else None
-            }
-            sessions.append(session_info)
-        
-        # Sort by last_used (most recent first)
-        sessions.sort(key=lambda x: x["last_used"] or "", reverse=True)
-        return sessions
-    
-    except Exception as e:
-        print(f"Error getting user active sessions: {e}")
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
         return []
 
+    to_iso = datetime.isoformat
+    # Most recently used first, ordered by the index
+    return [
+        {
+            "jti": token["jti"],
+            "created_at": to_iso(token["created_at"]) if token.get("created_at") else None,
+            "last_used": to_iso(token["last_used"]) if token.get("last_used") else None,
+            "ip_address": token.get("ip_address", "Unknown"),
+            "user_agent": token.get("user_agent", "Unknown Device"),
+            "expires_at": to_iso(token["expires_at"]) if token.get("expires_at") else None
+        }
+        async for token in iter_fetch(
+            "refresh_tokens",
+            {
+                "user_id": user_oid,
+                "is_revoked": False,
+                "expires_at": {"$gt": datetime.now(timezone.utc)}
+            },
+            sort=[("last_used", -1)],
+            limit=limit,
+            projection=_SESSION_FIELDS,
+            batch_size=limit
+        )
+    ]
+
+@db_errors_to_result(0)
+async def count_user_active_sessions(user_id: str) -> int:
+    """Count all active sessions for a user (get_user_active_sessions is capped)."""
+    try:
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return 0
+
+    return await count("refresh_tokens", {
+        "user_id": user_oid,
+        "is_revoked": False,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+
+@db_errors_to_result(None)
 async def get_refresh_token_with_user_check(jti: str, user_id: str) -> Optional[dict]:
     """Get refresh token and verify it belongs to the specified user."""
     try:
-        tokens = await fetch("refresh_tokens", {
-            "jti": jti,
-            "user_id": ObjectId(user_id),
-            "is_revoked": False
-        })
-        
-        if not tokens:
-            return None
-        
-        token = tokens[0]
-        # Check if token is expired
-        if token["expires_at"] < datetime.utcnow():
-            await revoke_refresh_token(jti)
-            return None
-        
-        return token
-    
-    except Exception as e:
-        print(f"Error getting refresh token with user check: {e}")
-        return None
\ No newline at end of file
+        user_oid = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return None
+
+    # Expiry is checked in the query (stored datetimes come back naive)
+    return await fetch_one("refresh_tokens", {
+        "jti": jti,
+        "user_id": user_oid,
+        "is_revoked": False,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
\ No newline at end of file
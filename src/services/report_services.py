@@ -1,19 +1,27 @@
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
-from src.utils.db import fetch, insert, update
+from cachetools import TTLCache
+from pymongo.errors import DuplicateKeyError
+from src.utils.db import fetch, insert, update, aggregate, exists
 from src.utils.serialize_helper import serialize_doc
 from src.services.chat_services import (
     get_conversation_by_id, 
-    get_message_by_id, 
+    get_message_with_conversation, 
     increment_report_count,
     get_user_display_name
 )
+import asyncio
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Statuses in which a report still counts as open. is_open (stored on every report
+# and keyed by the duplicate-report unique index) must equal status in this set,
+# so any code that changes a report's status must set is_open in the same write
+_OPEN_STATUSES = ("pending", "reviewed")
+
 # -------------------------
 # REPORT CREATION
 # -------------------------
@@ -33,32 +41,36 @@ async def create_report(
         if target_type == "conversation":
             target = await get_conversation_by_id(target_id)
             if not target:
-                logger.error(f"Conversation {target_id} not found for report")
+                logger.error("Conversation %s not found for report", target_id)
                 return None
             location_id = target["location_id"]
             conversation_id = target_id
         else:  # message
-            target = await get_message_by_id(target_id)
+            # Message and its conversation context come back from one pipeline
+            target = await get_message_with_conversation(target_id)
             if not target:
-                logger.error(f"Message {target_id} not found for report")
+                logger.error("Message %s not found for report", target_id)
                 return None
-            # Get conversation details for context
-            conversation = await get_conversation_by_id(target["conversation_id"])
+            conversation = target.pop("conversation")
             if not conversation:
-                logger.error(f"Conversation {target['conversation_id']} not found for message report")
+                logger.error("Conversation %s not found for message report", target['conversation_id'])
                 return None
             location_id = conversation["location_id"]
             conversation_id = target["conversation_id"]
         
-        # Check for duplicate reports from same user
-        existing_reports = await fetch("reports", {
+        # Check for duplicate reports from same user; is_open is the same key the
+        # unique index uses. Reports stored before the flag only carry a status
+        already_reported = await exists("reports", {
             "reporter_id": reporter_id,
             "target_id": target_id,
-            "status": {"$in": ["pending", "reviewed"]}
+            "$or": [
+                {"is_open": True},
+                {"is_open": {"$exists": False}, "status": {"$in": list(_OPEN_STATUSES)}}
+            ]
         })
         
-        if existing_reports:
-            logger.info(f"User {reporter_id} already reported {target_type} {target_id}")
+        if already_reported:
+            logger.info("User %s already reported %s %s", reporter_id, target_type, target_id)
             return None  # Already reported by this user
         
         # Get reporter information
@@ -68,6 +80,7 @@ async def create_report(
         priority = calculate_priority(reason)
         
         # Create report document
+        now = datetime.now(timezone.utc)
         report_data = {
             "id": str(uuid.uuid4()),
             "reporter_id": reporter_id,
@@ -91,81 +104,101 @@ async def create_report(
             
             # Status tracking
             "status": "pending",
+            "is_open": True,  # pending is an open status; see _OPEN_STATUSES
             "priority": priority,
             "admin_notes": None,
             "resolved_by": None,
             "resolved_at": None,
             
             # Timestamps
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
             
             # Analytics
             "report_count": 1
         }
         
-        # Insert report into database
-        report_id = await insert("reports", report_data)
+        # Insert report into database; the partial unique index rejects
+        # a duplicate that slipped past the check above concurrently
+        try:
+            report_id = await insert("reports", report_data)
+        except DuplicateKeyError:
+            logger.info("User %s already reported %s %s", reporter_id, target_type, target_id)
+            return None
         if not report_id:
-            logger.error(f"Failed to insert report for {target_type} {target_id}")
+            logger.error("Failed to insert report for %s %s", target_type, target_id)
             return None
         
-        # Update target content report count
-        await increment_report_count(target_type, target_id)
+        # Update target content report count; the new count tells us whether
+        # admins need to be notified without another query
+        report_count = await increment_report_count(target_type, target_id)
+        check_urgent_reports(target_type, target_id, report_count)
         
-        # Check if we need to notify admins about high-priority content
-        await check_urgent_reports(target_type, target_id)
-        
-        logger.info(f"Report created: {report_data['id']} for {target_type} {target_id} by user {reporter_id}")
+        logger.info("Report created: %s for %s %s by user %s", report_data['id'], target_type, target_id, reporter_id)
         
         return serialize_doc(report_data)
         
     except Exception as e:
-        logger.error(f"Error creating report: {e}")
+        logger.error("Error creating report: %s", e)
         return None
 
 # -------------------------
 # REPORT UTILITIES
 # -------------------------
 
+# Report reason -> priority; anything not listed is low priority
+_PRIORITY = {
+    "harassment": "high",
+    "inappropriate": "high",
+    "spam": "medium",
+    "misinformation": "medium",
+}
+
 def calculate_priority(reason: str) -> str:
     """Calculate report priority based on reason"""
-    high_priority_reasons = ["harassment", "inappropriate"]
-    medium_priority_reasons = ["spam", "misinformation"] 
-    
-    if reason in high_priority_reasons:
-        return "high"
-    elif reason in medium_priority_reasons:
-        return "medium"
-    else:
-        return "low"
+    return _PRIORITY.get(reason, "low")
+
+# The only non-JSON values in a report once _id is projected away
+_REPORT_DATETIME_FIELDS = ("created_at", "updated_at", "resolved_at")
+
+def _serialize_report(report: dict) -> dict:
+    """serialize_doc specialized for report documents fetched without _id"""
+    for field in _REPORT_DATETIME_FIELDS:
+        value = report.get(field)
+        if value is not None:
+            report[field] = value.isoformat()
+    return report
 
-async def check_urgent_reports(target_type: str, target_id: str):
+# Reports on one piece of content that make it urgent
+_URGENT_REPORT_THRESHOLD = 2
+
+def check_urgent_reports(target_type: str, target_id: str, report_count: int):
     """Check if content needs urgent admin attention"""
-    try:
-        # Count pending reports for this content
-        reports = await fetch("reports", {
-            "target_id": target_id,
-            "status": "pending"
-        })
-        
-        report_count = len(reports) if reports else 0
-        
-        # Log urgent cases for admin attention
-        if report_count >= 2:
-            logger.warning(
-                f"URGENT: {target_type.title()} {target_id} has {report_count} pending reports"
-            )
-        
-        # You could add webhook/email notifications here for your admin dashboard
-        
-    except Exception as e:
-        logger.error(f"Error checking urgent reports: {e}")
+    # Log urgent cases for admin attention
+    if report_count >= _URGENT_REPORT_THRESHOLD:
+        logger.warning(
+            "URGENT: %s %s has %s reports", target_type.title(), target_id, report_count
+        )
+    
+    # You could add webhook/email notifications here for your admin dashboard
 
 # -------------------------
 # REPORT QUERIES (FOR ADMIN DASHBOARD)
 # -------------------------
 
+# Summary fields for dashboard list views; get_report_by_id returns the full report
+_REPORT_LIST_FIELDS = {
+    "_id": 0,
+    "id": 1,
+    "status": 1,
+    "priority": 1,
+    "reason": 1,
+    "target_type": 1,
+    "target_id": 1,
+    "reporter_name": 1,
+    "created_at": 1
+}
+
 async def get_reports_by_status(
     status: Optional[str] = None,
     location_id: Optional[str] = None,
@@ -189,27 +222,28 @@ async def get_reports_by_status(
             query,
             skip=skip,
             limit=limit,
-            sort=[("priority", -1), ("created_at", -1)]  # High priority first, then newest
+            sort=[("priority", -1), ("created_at", -1)],  # High priority first, then newest
+            projection=_REPORT_LIST_FIELDS
         )
         
         if not reports:
             return []
         
-        return [serialize_doc(report) for report in reports]
+        return [_serialize_report(report) for report in reports]
         
     except Exception as e:
-        logger.error(f"Error fetching reports: {e}")
+        logger.error("Error fetching reports: %s", e)
         return None
 
 async def get_report_by_id(report_id: str) -> Optional[Dict]:
     """Get a specific report by ID"""
     try:
-        reports = await fetch("reports", {"id": report_id})
+        reports = await fetch("reports", {"id": report_id}, limit=1, projection={"_id": 0})
         if not reports:
             return None
-        return serialize_doc(reports[0])
+        return _serialize_report(reports[0])
     except Exception as e:
-        logger.error(f"Error fetching report {report_id}: {e}")
+        logger.error("Error fetching report %s: %s", report_id, e)
         return None
 
 async def get_reports_for_content(target_type: str, target_id: str) -> Optional[List[Dict]]:
@@ -218,56 +252,86 @@ async def get_reports_for_content(target_type: str, target_id: str) -> Optional[
         reports = await fetch("reports", {
             "target_type": target_type,
             "target_id": target_id
-        }, sort=[("created_at", -1)])
+        }, sort=[("created_at", -1)], projection={"_id": 0})
         
         if not reports:
             return []
         
-        return [serialize_doc(report) for report in reports]
+        return [_serialize_report(report) for report in reports]
         
     except Exception as e:
-        logger.error(f"Error fetching reports for {target_type} {target_id}: {e}")
+        logger.error("Error fetching reports for %s %s: %s", target_type, target_id, e)
         return None
 
 # -------------------------
 # REPORT ANALYTICS
 # -------------------------
 
+# Dashboard stats scan the whole collection; serve them from memory for a minute
+_STATS_KEY = "report_statistics"
+_stats_cache = TTLCache(maxsize=1, ttl=60)
+_stats_lock: Optional[asyncio.Lock] = None  # Created on first use, inside the running loop (3.9 binds at creation)
+
 async def get_report_statistics() -> Dict:
     """Get overall report statistics for admin dashboard"""
+    cached = _stats_cache.get(_STATS_KEY)
+    if cached is not None:
+        return cached
+
+    # One aggregation at a time; callers arriving while it runs reuse its result.
+    # A single lock that is never dropped, so no caller can ever get a second one
+    global _stats_lock
+    if _stats_lock is None:
+        _stats_lock = asyncio.Lock()
+    async with _stats_lock:
+        cached = _stats_cache.get(_STATS_KEY)
+        if cached is not None:
+            return cached
+        return await _compute_report_statistics()
+
+async def _compute_report_statistics() -> Dict:
+    """Run the statistics aggregation and cache a successful result"""
     try:
-        # Total reports
-        all_reports = await fetch("reports", {})
-        total_reports = len(all_reports) if all_reports else 0
+        # All counts in one server-side pass over the reports collection
+        facets = await aggregate("reports", [
+            {"$facet": {
+                "total": [{"$count": "n"}],
+                "pending": [{"$match": {"status": "pending"}}, {"$count": "n"}],
+                "by_reason": [
+                    {"$group": {"_id": {"$ifNull": ["$reason", "unknown"]}, "n": {"$sum": 1}}}
+                ],
+                "top_content": [
+                    {"$group": {"_id": {"type": "$target_type", "id": "$target_id"}, "n": {"$sum": 1}}},
+                    {"$sort": {"n": -1, "_id": 1}},
+                    {"$limit": 10}
+                ]
+            }}
+        ])
+        stats = facets[0]
         
-        # Pending reports
-        pending_reports = await fetch("reports", {"status": "pending"})
-        pending_count = len(pending_reports) if pending_reports else 0
+        total_reports = stats["total"][0]["n"] if stats["total"] else 0
+        pending_count = stats["pending"][0]["n"] if stats["pending"] else 0
         
         # Reports by reason
-        reason_counts = {}
-        if all_reports:
-            for report in all_reports:
-                reason = report.get("reason", "unknown")
-                reason_counts[reason] = reason_counts.get(reason, 0) + 1
+        reason_counts = {row["_id"]: row["n"] for row in stats["by_reason"]}
         
         # Most reported content
-        content_reports = {}
-        if all_reports:
-            for report in all_reports:
-                target_key = f"{report['target_type']}:{report['target_id']}"
-                content_reports[target_key] = content_reports.get(target_key, 0) + 1
+        content_reports = {
+            f"{row['_id']['type']}:{row['_id']['id']}": row["n"] for row in stats["top_content"]
+        }
         
-        return {
+        statistics = {
             "total_reports": total_reports,
             "pending_reports": pending_count,
             "resolved_reports": total_reports - pending_count,
             "reports_by_reason": reason_counts,
-            "most_reported_content": dict(sorted(content_reports.items(), key=lambda x: x[1], reverse=True)[:10])
+            "most_reported_content": content_reports
         }
+        _stats_cache[_STATS_KEY] = statistics
+        return statistics
         
     except Exception as e:
-        logger.error(f"Error getting report statistics: {e}")
+        logger.error("Error getting report statistics: %s", e)
         return {
             "total_reports": 0,
             "pending_reports": 0, 
@@ -1,18 +1,18 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set
-import json
+from typing import Dict, Iterable, List, Set
 import asyncio
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
     def __init__(self):
-        # Location-level connections: location_id -> list of websockets
-        self.location_connections: Dict[str, List[WebSocket]] = {}
+        # Location-level connections: location_id -> set of websockets
+        self.location_connections: Dict[str, Set[WebSocket]] = {}
         
-        # Conversation-level connections: conversation_id -> list of websockets
-        self.conversation_connections: Dict[str, List[WebSocket]] = {}
+        # Conversation-level connections: conversation_id -> set of websockets
+        self.conversation_connections: Dict[str, Set[WebSocket]] = {}
         
         # User tracking: websocket -> user_id mapping
         self.websocket_users: Dict[WebSocket, str] = {}
@@ -29,14 +29,14 @@ class ConnectionManager:
         await websocket.accept()
         
         if location_id not in self.location_connections:
-            self.location_connections[location_id] = []
+            self.location_connections[location_id] = set()
         
-        self.location_connections[location_id].append(websocket)
+        self.location_connections[location_id].add(websocket)
         
         if user_id:
             self.websocket_users[websocket] = user_id
         
-        logger.info(f"User {user_id} connected to location {location_id}")
+        logger.info("User %s connected to location %s", user_id, location_id)
         
         # Send welcome message
         await websocket.send_json({
@@ -48,17 +48,17 @@ class ConnectionManager:
     async def disconnect_from_location(self, websocket: WebSocket, location_id: str):
         """Disconnect user from location updates"""
         if location_id in self.location_connections:
-            if websocket in self.location_connections[location_id]:
-                self.location_connections[location_id].remove(websocket)
-                
-                # Clean up empty location
-                if not self.location_connections[location_id]:
-                    del self.location_connections[location_id]
+            connections = self.location_connections[location_id]
+            connections.discard(websocket)
+            
+            # Clean up empty location
+            if not connections:
+                del self.location_connections[location_id]
         
         # Clean up user mapping
         if websocket in self.websocket_users:
             user_id = self.websocket_users.pop(websocket)
-            logger.info(f"User {user_id} disconnected from location {location_id}")
+            logger.info("User %s disconnected from location %s", user_id, location_id)
 
     async def broadcast_to_location(self, location_id: str, message: dict, exclude_websocket: WebSocket = None):
         """Broadcast message to all users connected to a location"""
@@ -67,17 +67,8 @@ class ConnectionManager:
 
         # Create a copy to avoid modification during iteration
         connections = self.location_connections[location_id].copy()
-        disconnected = []
-
-        for websocket in connections:
-            if websocket == exclude_websocket:
-                continue
-                
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.warning(f"Failed to send to websocket in location {location_id}: {e}")
-                disconnected.append(websocket)
+        payload = orjson.dumps(message).decode()
+        disconnected = await self._send_to_all(connections, payload, exclude_websocket, "location", location_id)
 
         # Clean up disconnected websockets
         for websocket in disconnected:
@@ -92,16 +83,16 @@ class ConnectionManager:
         await websocket.accept()
         
         if conversation_id not in self.conversation_connections:
-            self.conversation_connections[conversation_id] = []
+            self.conversation_connections[conversation_id] = set()
             self.conversation_users[conversation_id] = set()
         
-        self.conversation_connections[conversation_id].append(websocket)
+        self.conversation_connections[conversation_id].add(websocket)
         
         if user_id:
             self.websocket_users[websocket] = user_id
             self.conversation_users[conversation_id].add(user_id)
         
-        logger.info(f"User {user_id} connected to conversation {conversation_id}")
+        logger.info("User %s connected to conversation %s", user_id, conversation_id)
         
         # Send welcome message with active users count
         await websocket.send_json({
@@ -123,14 +114,14 @@ class ConnectionManager:
         user_id = self.websocket_users.get(websocket)
         
         if conversation_id in self.conversation_connections:
-            if websocket in self.conversation_connections[conversation_id]:
-                self.conversation_connections[conversation_id].remove(websocket)
-                
-                # Clean up empty conversation
-                if not self.conversation_connections[conversation_id]:
-                    del self.conversation_connections[conversation_id]
-                    if conversation_id in self.conversation_users:
-                        del self.conversation_users[conversation_id]
+            connections = self.conversation_connections[conversation_id]
+            connections.discard(websocket)
+            
+            # Clean up empty conversation
+            if not connections:
+                del self.conversation_connections[conversation_id]
+                if conversation_id in self.conversation_users:
+                    del self.conversation_users[conversation_id]
         
         # Remove user from active users
         if conversation_id in self.conversation_users and user_id:
@@ -139,7 +130,7 @@ class ConnectionManager:
         # Clean up user mapping
         if websocket in self.websocket_users:
             self.websocket_users.pop(websocket)
-            logger.info(f"User {user_id} disconnected from conversation {conversation_id}")
+            logger.info("User %s disconnected from conversation %s", user_id, conversation_id)
         
         # Notify others about user leaving
         if user_id:
@@ -156,17 +147,10 @@ class ConnectionManager:
 
         # Create a copy to avoid modification during iteration
         connections = self.conversation_connections[conversation_id].copy()
-        disconnected = []
-
-        for websocket in connections:
-            if websocket == exclude_websocket:
-                continue
-                
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.warning(f"Failed to send to websocket in conversation {conversation_id}: {e}")
-                disconnected.append(websocket)
+        payload = orjson.dumps(message).decode()
+        disconnected = await self._send_to_all(
+            connections, payload, exclude_websocket, "conversation", conversation_id
+        )
 
         # Clean up disconnected websockets
         for websocket in disconnected:
@@ -176,19 +160,44 @@ class ConnectionManager:
     # UTILITY METHODS
     # -------------------------
     
+    async def _send_to_all(
+        self,
+        connections: Iterable[WebSocket],
+        payload: str,
+        exclude_websocket: WebSocket,
+        scope: str,
+        scope_id: str
+    ) -> List[WebSocket]:
+        """Send a pre-serialized payload to every websocket concurrently; return the ones that failed"""
+        targets = [websocket for websocket in connections if websocket is not exclude_websocket]
+        results = await asyncio.gather(
+            *(websocket.send_text(payload) for websocket in targets),
+            return_exceptions=True
+        )
+
+        disconnected = []
+        for websocket, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to send to websocket in %s %s: %s", scope, scope_id, result)
+                disconnected.append(websocket)
+        return disconnected
+    
     def get_active_users_in_conversation(self, conversation_id: str) -> int:
         """Get count of active users in a conversation"""
         return len(self.conversation_users.get(conversation_id, set()))
     
     def get_active_users_in_location(self, location_id: str) -> int:
         """Get count of active users in a location"""
-        return len(self.location_connections.get(location_id, []))
+        return len(self.location_connections.get(location_id, set()))
     
     async def broadcast_to_all(self, message: dict):
         """Broadcast message to all connected users (admin feature)"""
-        # Broadcast to all locations
-        for location_id in self.location_connections:
-            await self.broadcast_to_location(location_id, message)
+        # Broadcast to all locations concurrently; snapshot the keys since
+        # failed sends can remove empty locations mid-broadcast
+        await asyncio.gather(*(
+            self.broadcast_to_location(location_id, message)
+            for location_id in list(self.location_connections)
+        ))
     
     def get_connection_stats(self) -> dict:
         """Get connection statistics for monitoring"""
@@ -216,8 +225,8 @@ async def cleanup_stale_connections():
             
             # Log current stats
             stats = manager.get_connection_stats()
-            logger.info(f"Connection stats: {stats}")
+            logger.info("Connection stats: %s", stats)
             
         except Exception as e:
-            logger.error(f"Error in cleanup task: {e}")
+            logger.error("Error in cleanup task: %s", e)
             await asyncio.sleep(60)
\ No newline at end of file
@@ -1,12 +1,16 @@
-from passlib.context import CryptContext
+import bcrypt
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 import os
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 from typing import Optional
-import re
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import functools
 import secrets
+import time
+from cachetools import TTLCache
 
 load_dotenv()
 
@@ -22,28 +26,71 @@ def validate_password_strength(password: str) -> bool:
     """
     if len(password) < 8:
         return False
-    if not re.search(r"[a-z]", password):
-        return False
-    if not re.search(r"[A-Z]", password):
-        return False
-    if not re.search(r"[0-9]", password):
-        return False
-    if not re.search(r"[\W_]", password):  # non-alphanumeric (special char)
-        return False
-    return True
+
+    # Classify every character in one pass instead of one regex scan per rule
+    has_lower = has_upper = has_digit = has_special = False
+    for c in password:
+        if "a" <= c <= "z":
+            has_lower = True
+        elif "A" <= c <= "Z":
+            has_upper = True
+        elif "0" <= c <= "9":
+            has_digit = True
+        elif c == "_" or not c.isalnum():  # non-alphanumeric (special char)
+            has_special = True
+        else:
+            continue
+        if has_lower and has_upper and has_digit and has_special:
+            return True
+    return False
 
 # ----------------------
 # PASSWORD HASHING SETUP
 # ----------------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only reads the first 72 bytes; truncate explicitly as passlib did
+    return password.encode("utf-8")[:72]
 
 def hash_password(password: str) -> str:
     """Hash a plain-text password."""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("ascii")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain-text password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.checkpw(_password_bytes(plain_password), hashed_password.encode("ascii"))
+
+@functools.lru_cache(maxsize=1)
+def _dummy_hash() -> bytes:
+    # Built lazily so importing the module (and each KDF worker) stays cheap
+    return bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(BCRYPT_ROUNDS))
+
+def dummy_verify_password() -> None:
+    """Burn one verify against a dummy hash.
+
+    Call on "no such user" / "no password" branches so they take as long as a
+    real verify and response time doesn't reveal whether an account exists.
+    """
+    bcrypt.checkpw(b"not-the-dummy-password", _dummy_hash())
+
+# bcrypt is CPU-bound; run it in worker processes so it never blocks the event loop.
+# Leave one core free for the loop itself.
+_KDF_POOL = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+
+async def hash_password_async(password: str) -> str:
+    """Hash a plain-text password without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_KDF_POOL, hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain-text password without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _KDF_POOL, verify_password, plain_password, hashed_password
+    )
+
+async def dummy_verify_password_async() -> None:
+    """dummy_verify_password without blocking the event loop."""
+    await asyncio.get_running_loop().run_in_executor(_KDF_POOL, dummy_verify_password)
 
 # ----------------------
 # JWT TOKEN SETUP
@@ -71,13 +118,24 @@ def create_refresh_token(user_id: str, user_email: str) -> str:
     }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Verified access-token payloads keyed by the raw token. Only valid tokens
+# are cached, and an entry is never served past the token's own "exp".
+_access_token_cache = TTLCache(maxsize=4096, ttl=60)
+
 def decode_access_token(token: str) -> dict:
     """Decode a JWT access token."""
+    payload = _access_token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return dict(payload)  # Callers may modify the returned dict
+        _access_token_cache.pop(token, None)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         if payload.get("type") != "access":
             return {}
-        return payload
+        _access_token_cache[token] = payload
+        return dict(payload)
     except JWTError:
         return {}
 
@@ -91,9 +149,11 @@ def decode_refresh_token(token: str) -> dict:
     except JWTError:
         return {}
 
-def generate_token_pair(user_id: str, user_email: str) -> dict:
+def generate_token_pair(user_id: str, user_email: str, user_name: Optional[str] = None) -> dict:
     """Generate both access and refresh tokens."""
     token_data = {"sub": user_email, "user_id": user_id}
+    if user_name:
+        token_data["name"] = user_name  # Lets write paths skip the author lookup
     
     access_token = create_access_token(token_data)
     refresh_token = create_refresh_token(user_id, user_email)
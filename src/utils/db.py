@@ -1,5 +1,10 @@
-from typing import Optional, List, Dict
+from typing import Any, Callable, Optional, List, Dict, AsyncIterator, Union
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel, ReturnDocument, UpdateOne, UpdateMany
+from pymongo.errors import ConnectionFailure, OperationFailure
+from datetime import datetime, timezone
+import copy
+import functools
 import logging
 from src.database.mongo import (
     fetch as find, 
@@ -12,6 +17,21 @@ from src.utils.logger import get_logger
 
 logger = get_logger("DB Manager")
 
+# --- Map database failures in a service call to its error result ---
+def db_errors_to_result(fallback: Any) -> Callable:
+    """Return a copy of `fallback` when the wrapped coroutine hits a MongoDB
+    connection/operation failure. Any other exception is a bug and propagates."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except (ConnectionFailure, OperationFailure):
+                logger.exception("Database error in %s", func.__name__)
+                return copy.deepcopy(fallback)
+        return wrapper
+    return decorator
+
 # --- Fetch documents ---
 async def fetch(
     collection_name: str, 
@@ -22,7 +42,7 @@ async def fetch(
     projection: Optional[dict] = None
 ) -> List[Dict]:
     filter = filter or {}
-    logger.info(f"Fetching from collection '{collection_name}' with filter: {filter}, skip={skip}, limit={limit}")
+    logger.info("Fetching from collection '%s' with filter: %s, skip=%s, limit=%s", collection_name, filter, skip, limit)
     result = await find(
         collection_name,
         filter=filter,
@@ -33,35 +53,254 @@ async def fetch(
     )
     return result
 
+# --- Fetch a single document ---
+async def fetch_one(collection_name: str, filter: dict, projection: Optional[dict] = None) -> Optional[Dict]:
+    logger.info("Fetching one from collection '%s' with filter: %s", collection_name, filter)
+    db = await get_db()
+    return await db[collection_name].find_one(filter, projection)
+
+# --- Stream documents without materializing the result set ---
+async def iter_fetch(
+    collection_name: str,
+    filter: Optional[dict] = None,
+    skip: int = 0,
+    limit: int = 1000,
+    sort: Optional[List] = None,
+    projection: Optional[dict] = None,
+    batch_size: int = 100
+) -> AsyncIterator[Dict]:
+    filter = filter or {}
+    logger.info("Streaming from collection '%s' with filter: %s, skip=%s, limit=%s", collection_name, filter, skip, limit)
+    db = await get_db()
+    cursor = db[collection_name].find(filter, projection)
+
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    cursor = cursor.batch_size(batch_size)
+
+    async for doc in cursor:
+        yield doc
+
+# --- Count matching documents server-side ---
+async def count(collection_name: str, filter: Optional[dict] = None, limit: int = 0) -> int:
+    filter = filter or {}
+    logger.info("Counting in '%s' with filter: %s", collection_name, filter)
+    db = await get_db()
+    if limit:
+        # Stop counting once the caller's threshold is reached
+        return await db[collection_name].count_documents(filter, limit=limit)
+    return await db[collection_name].count_documents(filter)
+
+# --- Check whether any document matches ---
+async def exists(collection_name: str, filter: dict) -> bool:
+    logger.info("Checking existence in '%s' with filter: %s", collection_name, filter)
+    db = await get_db()
+    doc = await db[collection_name].find_one(filter, {"_id": 1})
+    return doc is not None
+
+# --- Fetch the first document in a given sort order ---
+async def find_one_sorted(
+    collection_name: str,
+    filter: dict,
+    sort: List,
+    projection: Optional[dict] = None
+) -> Optional[Dict]:
+    db = await get_db()
+    docs = await db[collection_name].find(filter, projection).sort(sort).limit(1).to_list(length=1)
+    return docs[0] if docs else None
+
+# --- Run an aggregation pipeline ---
+async def aggregate(collection_name: str, pipeline: List[dict]) -> List[Dict]:
+    logger.info("Aggregating on collection '%s' with %s stages", collection_name, len(pipeline))
+    db = await get_db()
+    return await db[collection_name].aggregate(pipeline).to_list(length=None)
+
+# --- Stream aggregation results without materializing them ---
+async def iter_aggregate(
+    collection_name: str,
+    pipeline: List[dict],
+    batch_size: int = 100
+) -> AsyncIterator[Dict]:
+    logger.info("Streaming aggregation on collection '%s' with %s stages", collection_name, len(pipeline))
+    db = await get_db()
+    async for doc in db[collection_name].aggregate(pipeline, batchSize=batch_size):
+        yield doc
+
 # --- Insert a single document ---
 async def insert(collection_name: str, data: dict) -> str:
-    logger.info(f"Inserting into collection '{collection_name}': {data}")
+    logger.info("Inserting into collection '%s': %s", collection_name, data)
     inserted_id = await insert_one(collection_name, data)
     return str(inserted_id)
 
-# --- Update a single document by _id ---
-async def update(collection_name: str, record_id: str, updated_data: dict) -> bool:
-    logger.info(f"Updating record {record_id} in '{collection_name}' with {updated_data}")
+# --- Insert many documents in one unordered round-trip ---
+async def insert_many(collection_name: str, documents: List[dict]) -> List[str]:
+    logger.info("Inserting %s documents into collection '%s'", len(documents), collection_name)
+    db = await get_db()
+    result = await db[collection_name].insert_many(documents, ordered=False)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+# --- Update a single document by _id or filter ---
+async def update(collection_name: str, record_id: Union[str, dict], updated_data: dict) -> bool:
+    logger.info("Updating record %s in '%s' with %s", record_id, collection_name, updated_data)
     success = await update_one(collection_name, record_id, updated_data)
     return success
 
 # --- Delete a single document by _id ---
 async def delete(collection_name: str, record_id: str) -> bool:
-    logger.info(f"Deleting record {record_id} from '{collection_name}'")
+    logger.info("Deleting record %s from '%s'", record_id, collection_name)
     success = await delete_one(collection_name, record_id)
     return success
 
+# --- Update or insert a single document in one round-trip ---
+async def upsert(
+    collection_name: str,
+    filter: dict,
+    set_fields: dict,
+    set_on_insert_fields: Optional[dict] = None
+) -> bool:
+    logger.info("Upserting into '%s' matching %s", collection_name, filter)
+    db = await get_db()
+    update_doc = {"$set": set_fields}
+    if set_on_insert_fields:
+        update_doc["$setOnInsert"] = set_on_insert_fields
+    result = await db[collection_name].update_one(filter, update_doc, upsert=True)
+    return result.matched_count > 0 or result.upserted_id is not None
+
+# --- Atomically adjust counters on a single document ---
+async def increment(
+    collection_name: str,
+    filter: dict,
+    inc_fields: dict,
+    set_fields: Optional[dict] = None
+) -> bool:
+    logger.info("Incrementing %s in '%s' matching %s", inc_fields, collection_name, filter)
+    db = await get_db()
+    update_doc = {"$inc": inc_fields, "$set": {"updated_at": datetime.now(timezone.utc), **(set_fields or {})}}
+    result = await db[collection_name].update_one(filter, update_doc)
+    return result.matched_count > 0
+
+# --- Update a single document and return it in the same round-trip ---
+async def find_one_and_update(
+    collection_name: str,
+    filter: dict,
+    update_doc: dict,
+    projection: Optional[dict] = None,
+    return_document: ReturnDocument = ReturnDocument.BEFORE
+) -> Optional[Dict]:
+    logger.info("Find-and-update in '%s' matching %s", collection_name, filter)
+    db = await get_db()
+    return await db[collection_name].find_one_and_update(
+        filter, update_doc, projection=projection, return_document=return_document
+    )
+
 # --- Update multiple documents ---
-async def update_many(collection_name: str, filter: dict, updated_data: dict) -> int:
+async def update_many(
+    collection_name: str,
+    filter: dict,
+    updated_data: dict
+) -> int:
     db = await get_db()
     update_doc = {"$set": updated_data}
     result = await db[collection_name].update_many(filter, update_doc)
-    logger.info(f"Updated {result.modified_count} documents in '{collection_name}' matching filter {filter}")
+    logger.info("Updated %s documents in '%s' matching filter %s", result.modified_count, collection_name, filter)
     return result.modified_count
 
+# --- Apply several updates to one collection in a single round-trip ---
+async def bulk_update(collection_name: str, operations: List[Union[UpdateOne, UpdateMany]]) -> int:
+    db = await get_db()
+    result = await db[collection_name].bulk_write(operations, ordered=False)
+    logger.info("Bulk update on '%s': %s ops, matched %s, modified %s", collection_name, len(operations), result.matched_count, result.modified_count)
+    return result.matched_count
+
 # --- Delete multiple documents ---
-async def delete_many(collection_name: str, filter: dict) -> int:
+async def delete_many(
+    collection_name: str,
+    filter: dict
+) -> int:
     db = await get_db()
     result = await db[collection_name].delete_many(filter)
-    logger.info(f"Deleted {result.deleted_count} documents from '{collection_name}' matching filter {filter}")
+    logger.info("Deleted %s documents from '%s' matching filter %s", result.deleted_count, collection_name, filter)
     return result.deleted_count
+
+# --- Indexes backing the hot query predicates ---
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING), ("is_active", ASCENDING)], background=True),
+    ],
+    "conversations": [
+        IndexModel([("id", ASCENDING)], unique=True, background=True),
+        IndexModel(
+            [("location_id", ASCENDING), ("is_active", ASCENDING), ("category", ASCENDING), ("last_activity", DESCENDING)],
+            background=True
+        ),
+        IndexModel(
+            [("location_id", ASCENDING), ("is_active", ASCENDING), ("last_activity", DESCENDING), ("created_at", DESCENDING)],
+            background=True
+        ),
+    ],
+    "messages": [
+        IndexModel([("id", ASCENDING)], unique=True, background=True),
+        IndexModel(
+            [("conversation_id", ASCENDING), ("is_deleted", ASCENDING), ("timestamp", DESCENDING)],
+            background=True
+        ),
+        IndexModel(
+            [("conversation_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+            background=True
+        ),
+        IndexModel(
+            [("author_id", ASCENDING), ("is_deleted", ASCENDING), ("timestamp", DESCENDING)],
+            background=True
+        ),
+    ],
+    "user_conversation_activity": [
+        IndexModel([("user_id", ASCENDING), ("conversation_id", ASCENDING)], unique=True, background=True),
+    ],
+    "refresh_tokens": [
+        IndexModel([("jti", ASCENDING), ("is_revoked", ASCENDING)], unique=True, background=True),
+        IndexModel([("user_id", ASCENDING), ("is_revoked", ASCENDING), ("expires_at", ASCENDING)], background=True),
+        IndexModel([("user_id", ASCENDING), ("is_revoked", ASCENDING), ("last_used", DESCENDING)], background=True),
+        # TTL: the server deletes tokens once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, background=True),
+    ],
+    "reports": [
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("created_at", DESCENDING)], background=True),
+        IndexModel([("location_id", ASCENDING), ("priority", DESCENDING), ("created_at", DESCENDING)], background=True),
+        IndexModel([("reason", ASCENDING)], background=True),
+        IndexModel([("target_type", ASCENDING), ("target_id", ASCENDING)], background=True),
+        IndexModel(
+            [("reporter_id", ASCENDING), ("target_id", ASCENDING)],
+            unique=True,
+            # is_open is True while a report is pending/reviewed; an equality
+            # filter works on every server version, unlike $in (6.0+ only)
+            partialFilterExpression={"is_open": True},
+            background=True,
+        ),
+    ],
+    "user_locations": [
+        IndexModel([("id", ASCENDING)], unique=True, background=True),
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING), ("joined_at", DESCENDING)], background=True),
+        IndexModel([("geo", GEOSPHERE)], background=True),
+    ],
+    "chat_participants": [
+        IndexModel([("location_id", ASCENDING), ("is_online", ASCENDING)], background=True),
+    ],
+}
+
+async def ensure_indexes() -> None:
+    db = await get_db()
+    for collection_name, indexes in INDEXES.items():
+        # One index per command so a failure (e.g. existing duplicates under a
+        # unique index) only skips that index and never blocks startup
+        for index in indexes:
+            try:
+                names = await db[collection_name].create_indexes([index])
+                logger.info("Ensured indexes on '%s': %s", collection_name, names)
+            except OperationFailure as e:
+                logger.error(
+                    "Could not create index %s on '%s': %s", index.document["name"], collection_name, e
+                )
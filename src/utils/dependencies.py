@@ -10,3 +10,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
     return user_id
+
+async def get_current_user_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """Like get_current_user, but also returns the display name carried in the token."""
+    payload = decode_access_token(token)
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {"id": user_id, "name": payload.get("name")}
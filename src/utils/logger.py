@@ -1,12 +1,19 @@
+import functools
 import logging
 import sys
 from datetime import datetime
 from typing import Optional
 
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Shared by every logger that uses the default format
+_FORMATTER = logging.Formatter(DEFAULT_FORMAT)
+
 def get_logger(
     name: str = __name__, 
     level: int = logging.INFO,
-    format_string: Optional[str] = None
+    format_string: Optional[str] = None,
+    propagate: bool = True
 ) -> logging.Logger:
     """
     Create and configure a logger for console output.
@@ -15,18 +22,16 @@ def get_logger(
         name: Logger name (usually __name__)
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         format_string: Custom format string for log messages
+        propagate: Whether records also reach ancestor (e.g. root) handlers
     
     Returns:
         Configured logger instance
     """
     
-    # Default format string
-    if format_string is None:
-        format_string = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    
     # Create logger
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    logger.propagate = propagate
     
     # Prevent adding handlers multiple times
     if not logger.handlers:
@@ -34,8 +39,8 @@ def get_logger(
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
         
-        # Create formatter
-        formatter = logging.Formatter(format_string)
+        # Reuse the shared formatter unless a custom format is requested
+        formatter = _FORMATTER if format_string is None else logging.Formatter(format_string)
         console_handler.setFormatter(formatter)
         
         # Add handler to logger
@@ -43,23 +48,25 @@ def get_logger(
     
     return logger
 
+# Each named logger is resolved and configured once; get_logger calls setLevel,
+# which would otherwise run (and flush logging's level cache) on every message
+@functools.lru_cache(maxsize=None)
+def _quick_logger(logger_name: str) -> logging.Logger:
+    return get_logger(logger_name)
+
 # Convenience function for quick logging
 def log_info(message: str, logger_name: str = "Localoop"):
     """Quick info logging"""
-    logger = get_logger(logger_name)
-    logger.info(message)
+    _quick_logger(logger_name).info(message)
 
 def log_error(message: str, logger_name: str = "Localoop"):
     """Quick error logging"""
-    logger = get_logger(logger_name)
-    logger.error(message)
+    _quick_logger(logger_name).error(message)
 
 def log_warning(message: str, logger_name: str = "Localoop"):
     """Quick warning logging"""
-    logger = get_logger(logger_name)
-    logger.warning(message)
+    _quick_logger(logger_name).warning(message)
 
 def log_debug(message: str, logger_name: str = "Localoop"):
-    """Quick debug logging"""
-    logger = get_logger(logger_name, level=logging.DEBUG)
-    logger.debug(message)
\ No newline at end of file
+    """Quick debug logging (emitted only if the logger is set to DEBUG)"""
+    _quick_logger(logger_name).debug(message)
@@ -1,17 +1,24 @@
 from bson import ObjectId
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterable, List
 
-def serialize_doc(doc: dict) -> dict:
+# BSON decoding yields exactly these types, so one dict lookup on type(value)
+# replaces the isinstance chain for every field
+_CONVERTERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+}
+
+def serialize_doc(doc: dict, _converters: dict = _CONVERTERS, _type=type) -> dict:
     """Convert MongoDB document to JSON/Pydantic-safe dict."""
     serialized = {}
     for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            serialized[key] = str(value)
-        elif isinstance(value, datetime):
-            serialized[key] = value.isoformat()
-        else:
-            serialized[key] = value
+        convert = _converters.get(_type(value))
+        serialized[key] = convert(value) if convert else value
     # Optionally remove internal MongoDB _id if you want
-    serialized.pop("_id", None) 
+    serialized.pop("_id", None)
     return serialized
+
+def serialize_docs(docs: Iterable[dict]) -> List[dict]:
+    """Serialize a batch of MongoDB documents with serialize_doc."""
+    return [serialize_doc(doc) for doc in docs]